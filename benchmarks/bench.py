@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+import plotly.express as px
+
+from engine import PARSE_WORKERS, parse_many
+from excel_reader import iter_sheet_blocks
+from factstore import DOWNTIME, PRODUCTION, FactStore
+from figures import trend_line
+from parsing import read_error_data, read_production_data
+from rollups import daily_downtime, daily_production, resample_sums
+from schema import compact_downtime, compact_production, concat_frames
+from storage import name_date
+from synth import generate
+
+# -------------------------------------------------------
+#                 PIPELINE BENCHMARKS
+# -------------------------------------------------------
+# Times each stage on synthetic workbooks (no network):
+#   read       openpyxl range reads (excel_reader)
+#   normalize  read_production_data / read_error_data + compact schema
+#   parse      the process pool end to end (engine.parse_many)
+#   store      fact store writes incl. daily rollups
+#   load       fact store read of the whole range
+#   aggregate  daily rollups + D/W/M/Y resampling + per-product sums
+#   figures    dashboard and trend figures from the rollups
+#
+#   python benchmarks/bench.py [--sizes 10 100 1000] [--compare results/X.json]
+#
+# Results go to benchmarks/results/<timestamp>.json.  --compare prints the
+# ratio to an earlier run and exits non-zero when a stage got slower than
+# --threshold.
+
+DATA_DIR = os.environ.get("DM_BENCH_DATA", os.path.join(ROOT, ".cache", "bench"))
+RESULTS_DIR = os.path.join(HERE, "results")
+STAGES = ["read", "normalize", "parse", "store", "load", "aggregate", "figures"]
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t, out
+
+
+def _jobs(paths):
+    jobs = []
+    for p in paths:
+        name = os.path.basename(p)
+        with open(p, "rb") as fh:
+            jobs.append((fh.read(), name, name_date(name)))
+    return jobs
+
+
+def _read(jobs):
+    return [(name, fdate, list(iter_sheet_blocks(data))) for data, name, fdate in jobs]
+
+
+def _normalize(blocks):
+    out = []
+    for name, fdate, sheets in blocks:
+        prods, errs = [], []
+        for sheet, prod_block, err_block in sheets:
+            prods.append(read_production_data(prod_block, name, sheet, fdate))
+            errs.append(read_error_data(err_block, sheet, name, fdate))
+        out.append((compact_production(concat_frames(prods)),
+                    compact_downtime(concat_frames(errs))))
+    return out
+
+
+def _store(root, jobs, results):
+    store = FactStore(root)
+    with store.batch():
+        for (_, name, fdate), res in zip(jobs, results):
+            store.ingest(name, fdate, name, res.prod, res.err)
+    return store
+
+
+def _aggregate(prod, err):
+    dp, de = daily_production(prod), daily_downtime(err)
+    for freq in ("D", "W", "ME", "YE"):
+        resample_sums(dp, freq, ["Ton", "PackQty", "PotentialProduction", "Waste"])
+        resample_sums(de, freq, ["Duration"])
+    dp.groupby("Product")[["Ton", "Waste", "PackQty", "PotentialProduction"]].sum()
+    de.groupby("ErrorCode")["Duration"].sum()
+    return dp, de
+
+
+def _figures(dp, de, labels):
+    by_product = dp.groupby("Product")[["Ton", "Waste", "PackQty"]].sum().reset_index()
+    by_error = de.groupby("ErrorCode")["Duration"].sum().reset_index()
+    by_error["Error"] = labels(by_error["ErrorCode"])
+    figs = [
+        px.treemap(by_product, path=[px.Constant("All Products"), "Product"], values="Ton"),
+        px.bar(by_product, x="Product", y="Waste", color="Product"),
+        px.bar(by_error, x="Error", y="Duration"),
+    ]
+    daily = resample_sums(dp, "D", ["Ton", "PackQty"])
+    figs.append(trend_line(daily, "Date", "Ton", "Daily Ton"))
+    figs.append(trend_line(resample_sums(de, "D", ["Duration"]), "Date", "Duration", "Downtime"))
+    for f in figs:
+        f.to_plotly_json()       # what st.plotly_chart serializes
+    return figs
+
+
+def run_size(paths, workers):
+    jobs = _jobs(paths)
+    res = {}
+    res["read"], blocks = _timed(lambda: _read(jobs))
+    res["normalize"], _ = _timed(lambda: _normalize(blocks))
+    res["parse"], parsed = _timed(lambda: list(parse_many(jobs, workers)))
+
+    root = tempfile.mkdtemp(prefix="dm-bench-")
+    try:
+        res["store"], store = _timed(lambda: _store(root, jobs, parsed))
+        names = [name for _, name, _ in jobs]
+        res["load"], (prod, err) = _timed(
+            lambda: (store.read(PRODUCTION, names), store.read(DOWNTIME, names))
+        )
+        res["aggregate"], (dp, de) = _timed(lambda: _aggregate(prod, err))
+        res["figures"], _ = _timed(lambda: _figures(dp, de, store.codes.labels))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    res["rows"] = len(prod)
+    return res
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline, threshold):
+    worse = []
+    print(f"\n{'size':>6} {'stage':<10} {'base s':>9} {'now s':>9} {'ratio':>7}")
+    for size, stages in current["results"].items():
+        base = baseline["results"].get(size)
+        if not base:
+            continue
+        for stage in STAGES:
+            if stage not in base or stage not in stages:
+                continue
+            ratio = stages[stage] / base[stage] if base[stage] else float("inf")
+            flag = "  <-- slower" if ratio > threshold else ""
+            print(f"{size:>6} {stage:<10} {base[stage]:9.3f} {stages[stage]:9.3f} {ratio:7.2f}{flag}")
+            if ratio > threshold:
+                worse.append((size, stage))
+    return worse
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark parsing, storage, aggregation and figures")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    ap.add_argument("--workers", type=int, default=PARSE_WORKERS)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="result file (default: results/<timestamp>.json)")
+    ap.add_argument("--compare", default=None, help="earlier result file to compare against")
+    ap.add_argument("--threshold", type=float, default=1.25,
+                    help="ratio above which a stage counts as a regression")
+    args = ap.parse_args()
+
+    data = os.path.join(DATA_DIR, f"seed{args.seed}")
+    print(f"generating up to {max(args.sizes)} workbook(s) in {data} ...")
+    paths = generate(data, max(args.sizes), args.seed)
+
+    results = {}
+    for n in sorted(args.sizes):
+        r = run_size(paths[:n], args.workers)
+        results[str(n)] = r
+        timings = "  ".join(f"{s}={r[s]:.3f}s" for s in STAGES)
+        print(f"{n:>5} files, {r['rows']} rows: {timings}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"results saved to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
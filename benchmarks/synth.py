@@ -0,0 +1,131 @@
+import argparse
+import os
+import random
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+
+import openpyxl
+
+# -------------------------------------------------------
+#          SYNTHETIC PRODUCTION WORKBOOKS
+# -------------------------------------------------------
+# Same layout the parser expects (see excel_reader.py):
+#   D2:P3   headers (row 3, sometimes only row 2)
+#   D4:P9   six production rows
+#   G12:H.. error text / duration pairs
+# One workbook per day, named prod_DDMMYYYY.xlsx.  Each machine gets one
+# or two sheets; start / end / duration cells mix every format the
+# converters handle, and some shifts cross midnight.
+#
+#   python benchmarks/synth.py <out dir> <n files> [--seed N]
+
+HEADERS = ["start", "finish", "production title", "cap", "manpower",
+           "quanity", "waste"]
+PRODUCTS = ["Milk", "milk ", "Yogurt", "yogurt", "Cream", "Doogh", "Cheese",
+            "Butter", "Kefir", "Labneh"]
+ERRORS = ["Jam", " jam", "Power Off", "power  off", "No Material", "CIP",
+          "Label Error", "Sealing", "Changeover", "Cleaning", "Air Pressure"]
+# sheet names per machine type of machines.json
+MACHINE_SHEETS = [
+    ["Gasti", "GASTI 2"],
+    ["200cc", "200 CC line B"],
+    ["125", "125 cup"],
+    ["1000cc", "1000"],
+]
+START_DATE = date(2022, 1, 1)
+
+
+def _clock(rnd, hour, minute):
+    # one time of day in a random cell format
+    kind = rnd.randrange(6)
+    if kind == 0:
+        return time(hour, minute)
+    if kind == 1:
+        return f"{hour:02d}:{minute:02d}"
+    if kind == 2:
+        return f"{hour}:{minute:02d}:00"
+    if kind == 3:
+        return hour * 100 + minute                  # HMM number
+    if kind == 4:
+        return (hour * 60 + minute) / 1440          # Excel day fraction
+    return datetime(1900, 1, 1, hour, minute)
+
+
+def _duration(rnd):
+    minutes = rnd.randint(5, 240)
+    kind = rnd.randrange(5)
+    if kind == 0:
+        return time(minutes // 60, minutes % 60)
+    if kind == 1:
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    if kind == 2:
+        return f"{minutes // 60}:{minutes % 60:02d}:00"
+    if kind == 3:
+        return minutes                              # plain minutes
+    return minutes / 1440
+
+
+def _sheet(ws, rnd):
+    header_row = 3 if rnd.random() < 0.8 else 2
+    for i, h in enumerate(HEADERS):
+        ws.cell(row=header_row, column=4 + i, value=h)
+
+    for r in range(4, 10):
+        if rnd.random() < 0.1:
+            continue                                 # empty shift
+        start_h = rnd.choice([6, 7, 8, 14, 15, 22, 23])
+        length = rnd.randint(2, 9)
+        end_h = (start_h + length) % 24              # 22:00 -> 03:00 etc.
+        ws.cell(row=r, column=4, value=_clock(rnd, start_h, rnd.choice([0, 15, 30])))
+        ws.cell(row=r, column=5, value=_clock(rnd, end_h, rnd.choice([0, 30, 45])))
+        ws.cell(row=r, column=6, value=rnd.choice(PRODUCTS))
+        ws.cell(row=r, column=7, value=rnd.randint(500, 4000))
+        ws.cell(row=r, column=8, value=rnd.randint(2, 9))
+        ws.cell(row=r, column=9, value=rnd.randint(1000, 30000))
+        ws.cell(row=r, column=10, value=rnd.randint(0, 400))
+
+    for r in range(12, 12 + rnd.randint(0, 25)):
+        ws.cell(row=r, column=7, value=rnd.choice(ERRORS))
+        ws.cell(row=r, column=8, value=_duration(rnd))
+
+
+def make_workbook(seed):
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for names in MACHINE_SHEETS:
+        for name in names[:rnd.choice([1, 1, 2])]:
+            _sheet(wb.create_sheet(name), rnd)
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def file_name(i):
+    day = START_DATE + timedelta(days=i)
+    return f"prod_{day:%d%m%Y}.xlsx"
+
+
+def generate(directory, n, seed=0):
+    # -> paths of n workbooks in directory; existing files are kept
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(n):
+        path = os.path.join(directory, file_name(i))
+        if not os.path.exists(path):
+            data = make_workbook(seed * 1_000_003 + i)
+            with open(path + ".tmp", "wb") as fh:
+                fh.write(data)
+            os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Generate synthetic production workbooks")
+    ap.add_argument("out")
+    ap.add_argument("n", type=int)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    generate(args.out, args.n, args.seed)
+    print(f"{args.n} workbook(s) in {args.out}")
@@ -0,0 +1,173 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from metrics import count
+
+# -------------------------------------------------------
+#       PROCESS-WIDE, SINGLE-FLIGHT DATASET CACHE
+# -------------------------------------------------------
+# One cache per server process, shared by every browser session.
+# Concurrent requests for the same key wait for a single in-flight
+# computation; entries are evicted LRU once their estimated in-memory size
+# exceeds DM_DATASET_CACHE_MB.  Callers get shallow copies of the cached
+# frames: they share the column data, and copy-on-write turns any write
+# into a private copy, so one session can never alter another's view.
+# A computation can decline to be kept (keep returns False), e.g. when a
+# source it needed was not available: the caller still gets the value,
+# and the next request computes it again.
+
+DATASET_CACHE_MB = int(os.environ.get("DM_DATASET_CACHE_MB", 512))
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # default (and only) behaviour from pandas 3 on
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _frame_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(_frame_bytes(v) for v in value)
+    return 0
+
+
+def _share(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_share(v) for v in value)
+    return value
+
+
+class DatasetCache:
+    def __init__(self, max_bytes=DATASET_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()     # key -> (value, nbytes)
+        self._inflight = {}               # key -> Future
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute, keep=None):
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    count("dataset_cache_hits")
+                    return _share(self._entries[key][0])
+                fut = self._inflight.get(key)
+                owner = fut is None
+                if owner:
+                    fut = Future()
+                    self._inflight[key] = fut
+                    self.misses += 1
+                    count("dataset_cache_misses")
+
+            if owner:
+                return _share(self._compute(key, fut, compute, keep))
+
+            try:
+                return _share(fut.result())
+            except BaseException:
+                # the owner was interrupted (e.g. its session reran);
+                # loop and take over the computation ourselves
+                continue
+
+    def get_or_compute_many(self, keys, compute_missing, keep=None):
+        # Batch form: compute_missing(list_of_keys) -> {key: value} is called
+        # once with every key that is neither cached nor in flight elsewhere;
+        # keep(key) -> False leaves that value out of the cache.
+        keys = list(dict.fromkeys(keys))
+        result = {}
+        while True:
+            owned = {}
+            waiting = {}
+            with self._lock:
+                for key in keys:
+                    if key in result:
+                        continue
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        count("dataset_cache_hits")
+                        result[key] = self._entries[key][0]
+                        continue
+                    fut = self._inflight.get(key)
+                    if fut is None:
+                        owned[key] = self._inflight[key] = Future()
+                        self.misses += 1
+                        count("dataset_cache_misses")
+                    else:
+                        waiting[key] = fut
+
+            if owned:
+                try:
+                    values = compute_missing(list(owned))
+                except BaseException as e:
+                    with self._lock:
+                        for key in owned:
+                            self._inflight.pop(key, None)
+                    for fut in owned.values():
+                        fut.set_exception(e)
+                    raise
+                for key, fut in owned.items():
+                    result[key] = self._store(key, fut, values[key],
+                                              keep is None or keep(key))
+
+            for key, fut in waiting.items():
+                try:
+                    result[key] = fut.result()
+                except BaseException:
+                    pass   # owner interrupted: picked up on the next pass
+
+            if len(result) == len(keys):
+                return {key: _share(result[key]) for key in keys}
+
+    def _compute(self, key, fut, compute, keep=None):
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        return self._store(key, fut, value, keep is None or keep())
+
+    def _store(self, key, fut, value, keep=True):
+        nbytes = _frame_bytes(value)
+        with self._lock:
+            self._inflight.pop(key, None)
+            if keep and nbytes <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[1]
+                self._entries[key] = (value, nbytes)
+                self._bytes += nbytes
+                self._evict()
+        fut.set_result(value)
+        return value
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from locks import file_lock, file_stamp
+
+# -------------------------------------------------------
+#      DOWNTIME REASONS: CANONICAL TEXT -> INTEGER CODE
+# -------------------------------------------------------
+# The same reason is typed many ways ("Power Off", "power  off", ...).
+# Error texts are canonicalized (case, whitespace, and the aliases of
+# downtime.json or DM_DOWNTIME_CONFIG) and each canonical reason gets an
+# integer code derived from its text, so every process (parse workers,
+# the app, the CLI) assigns the same code without sharing state.
+# Downtime is stored as code + minutes; aggregations group by the code
+# and labels are looked up only for the finished, small results.
+#
+#   downtime.json: {"aliases": {"power failure": "Power Off", ...}}
+#
+# Labels (code -> display text) are kept by the fact store in
+# <root>/_downtime_codes.json: an alias target, else the first spelling
+# seen.  New labels are merged into the file under its lock (locks.py).
+#
+# Codes are 31 bits of a hash, so two different reasons can share one.
+# That is never resolved silently: encode() and CodeLabels.register()
+# raise CodeCollision, and the file is reported as not loaded until one
+# of the two reasons is renamed with an alias.
+
+DOWNTIME_CONFIG = os.environ.get(
+    "DM_DOWNTIME_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "downtime.json")
+)
+
+
+def _key(text):
+    return " ".join(text.split()).casefold()
+
+
+class CodeCollision(ValueError):
+    pass
+
+
+def _check(code, label, other):
+    # label and other are display texts of the same code; their canonical
+    # keys must agree (an alias target canonicalizes to its own key)
+    if _key(label) != _key(other):
+        raise CodeCollision(
+            f"downtime reasons {other!r} and {label!r} hash to the same code "
+            f"{code}; map one of them to another name in downtime.json"
+        )
+
+
+def reason_code(key):
+    # stable across processes and runs (hash() is salted per process)
+    digest = hashlib.blake2b(key.encode(), digest_size=4).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFF
+
+
+class ReasonTable:
+    def __init__(self, aliases=None):
+        self.aliases = {_key(k): " ".join(v.split()) for k, v in (aliases or {}).items()}
+        self._memo = {}
+
+        raw = json.dumps(sorted(self.aliases.items()))
+        self.fingerprint = hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path=DOWNTIME_CONFIG):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                cfg = json.load(fh)
+        except FileNotFoundError:
+            cfg = {}
+        return cls(cfg.get("aliases", {}))
+
+    def canonical(self, value):
+        # raw cell -> (code, label), None for an empty cell
+        if value is None or (isinstance(value, float) and value != value):
+            return None
+        hit = self._memo.get(value)
+        if hit is not None:
+            return hit
+        text = " ".join(str(value).split())
+        if not text:
+            return None
+        key = _key(text)
+        label = self.aliases.get(key)
+        if label is not None:
+            key = _key(label)
+        res = (reason_code(key), label or text)
+        if len(self._memo) < 10_000:
+            self._memo[value] = res
+        return res
+
+    def encode(self, values):
+        # raw cells -> (int32 codes, -1 for empty; {code: label}), one
+        # canonicalization per distinct text
+        idx, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        ucodes = np.full(len(uniques) + 1, -1, dtype=np.int64)
+        labels = {}
+        for j, v in enumerate(uniques):
+            res = self.canonical(v)
+            if res is not None:
+                ucodes[j] = res[0]
+                first = labels.setdefault(res[0], res[1])     # first spelling wins
+                _check(res[0], res[1], first)
+        return ucodes[idx].astype(np.int32), labels
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_reasons():
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = ReasonTable.from_file()
+        return _table
+
+
+# -------------------------------------------------------
+#          CODE -> LABEL (KEPT NEXT TO THE FACT STORE)
+# -------------------------------------------------------
+class CodeLabels:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._labels = {}
+        self._stamp = None
+        self._refresh()
+
+    def _refresh(self):
+        # pick up labels written by other processes
+        stamp = file_stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                self._labels = {int(k): v for k, v in json.load(fh).items()}
+            self._stamp = stamp
+        except (OSError, ValueError):
+            pass
+
+    def register(self, err_df):
+        # err_df: parsed downtime with ErrorCode + Error (label) columns
+        if err_df is None or err_df.empty or "Error" not in err_df.columns:
+            return
+        pairs = err_df[["ErrorCode", "Error"]].drop_duplicates()
+        with self._lock, file_lock(self.path + ".lock"):
+            self._refresh()
+            new = {}
+            for c, l in zip(pairs["ErrorCode"], pairs["Error"]):
+                c, l = int(c), str(l)
+                first = self._labels.get(c) or new.setdefault(c, l)
+                _check(c, l, first)
+            if not new:
+                return
+            self._labels.update(new)
+            tmp = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(self._labels, fh)
+            os.replace(tmp, self.path)
+            self._stamp = file_stamp(self.path)
+
+    def label(self, code):
+        return self._labels.get(int(code), f"#{int(code)}")
+
+    def labels(self, codes):
+        self._refresh()
+        return [self.label(c) for c in codes]
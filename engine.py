@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from parsing import parse_workbook
+
+# -------------------------------------------------------
+#           PROCESS-POOL PARSING ENGINE
+# -------------------------------------------------------
+# Workbook parsing is CPU-bound pure Python, so files are spread across
+# worker processes.  Raw bytes go in, a ParseResult comes back.
+# DM_PARSE_WORKERS=1 parses inline in the calling thread.
+
+PARSE_WORKERS = int(os.environ.get("DM_PARSE_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork the multi-threaded Streamlit server
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _inline(file_bytes, fname, fdate):
+    fut = Future()
+    fut.set_result(parse_workbook(file_bytes, fname, fdate))
+    return fut
+
+
+def submit_parse(file_bytes, fname, fdate, workers=PARSE_WORKERS):
+    if workers <= 1:
+        return _inline(file_bytes, fname, fdate)
+    try:
+        return _get_pool(workers).submit(parse_workbook, file_bytes, fname, fdate)
+    except (BrokenProcessPool, RuntimeError):
+        _reset_pool()
+        return _inline(file_bytes, fname, fdate)
+
+
+def parse_result(fut, file_bytes, fname, fdate):
+    # A crashed worker takes the whole pool down; parse that file inline
+    # and start a fresh pool for the next batch.
+    try:
+        return fut.result()
+    except BrokenProcessPool:
+        _reset_pool()
+        return parse_workbook(file_bytes, fname, fdate)
+
+
+def parse_many(jobs, workers=PARSE_WORKERS):
+    # jobs: iterable of (file_bytes, fname, fdate).  Results are yielded in
+    # input order regardless of which worker finishes first.
+    jobs = list(jobs)
+    futures = [submit_parse(b, n, d, workers) for b, n, d in jobs]
+    for fut, (b, n, d) in zip(futures, jobs):
+        yield parse_result(fut, b, n, d)
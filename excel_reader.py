@@ -0,0 +1,77 @@
+from collections import namedtuple
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+
+# -------------------------------------------------------
+#             SHEET LAYOUT (1-BASED, INCLUSIVE)
+# -------------------------------------------------------
+# Production block: header rows 2–3 + data rows 4–9, columns D–P
+PROD_MIN_ROW, PROD_MAX_ROW = 2, 9
+PROD_MIN_COL, PROD_MAX_COL = 4, 16
+
+# Error block: error name / duration pairs in G12:H1000, cut at the last
+# used row
+ERR_MIN_ROW, ERR_MAX_ROW = 12, 1000
+ERR_MIN_COL, ERR_MAX_COL = 7, 8
+
+SheetBlocks = namedtuple("SheetBlocks", ["sheet_name", "production", "errors"])
+
+
+def _cell_value(v):
+    # same normalisation pd.read_excel applies to openpyxl cells
+    if v is None:
+        return np.nan
+    if isinstance(v, str):
+        if v == "" or v in ERROR_CODES:
+            return np.nan
+        return v
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _read_block(ws, min_row, max_row, min_col, max_col, pad_rows=True):
+    width = max_col - min_col + 1
+    rows = []
+    last_used = 0
+    for row in ws.iter_rows(min_row=min_row, max_row=max_row,
+                            min_col=min_col, max_col=max_col,
+                            values_only=True):
+        if any(v is not None for v in row):
+            vals = [_cell_value(v) for v in row]
+            vals += [np.nan] * (width - len(vals))
+            rows.append(vals)
+            last_used = len(rows)
+        else:
+            rows.append(None)
+
+    # The error block is not padded: it ends at the last row with a value
+    # (sheets often report formatted but empty rows up to row 1000)
+    if not pad_rows:
+        rows = rows[:last_used]
+    n = max_row - min_row + 1 if pad_rows else len(rows)
+    block = np.full((n, width), np.nan, dtype=object)
+    for i, vals in enumerate(rows):
+        if vals is not None:
+            block[i] = vals
+    return block
+
+
+# -------------------------------------------------------
+#      ONE PASS PER WORKBOOK (OPENPYXL READ-ONLY MODE)
+# -------------------------------------------------------
+def iter_sheet_blocks(file_bytes):
+    wb = openpyxl.load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            yield SheetBlocks(
+                ws.title,
+                _read_block(ws, PROD_MIN_ROW, PROD_MAX_ROW, PROD_MIN_COL, PROD_MAX_COL),
+                _read_block(ws, ERR_MIN_ROW, ERR_MAX_ROW, ERR_MIN_COL, ERR_MAX_COL,
+                            pad_rows=False),
+            )
+    finally:
+        wb.close()
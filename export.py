@@ -0,0 +1,102 @@
+import os
+import secrets
+import time
+import zipfile
+
+import requests
+
+from factstore import DOWNTIME, PRODUCTION
+from storage import (
+    supabase_delete,
+    supabase_download_many,
+    supabase_list_files,
+    supabase_put_object,
+    supabase_sign_urls,
+)
+
+# -------------------------------------------------------
+#          BULK EXPORT OF A DATE RANGE AS ONE ZIP
+# -------------------------------------------------------
+# Workbooks are downloaded concurrently and written into the archive as
+# they arrive; storage.supabase_download_many keeps only a small window of
+# files in memory.  The normalized tables are written source by source
+# through a streaming zip entry, so they are never materialized whole.
+#
+# The finished archive is streamed from disk into the bucket under
+# DM_EXPORT_PREFIX and handed out as a signed link, so the web server never
+# holds it in memory (st.download_button would).  Exports older than the
+# link lifetime are removed whenever a new one is published.
+
+EXPORT_PREFIX = os.environ.get("DM_EXPORT_PREFIX", "exports")
+EXPORT_LINK_TTL = int(os.environ.get("DM_EXPORT_LINK_TTL", 3600))
+
+
+def _write_table_csv(zf, arcname, store, table, names):
+    header_done = False
+    with zf.open(arcname, "w", force_zip64=True) as out:
+        for name in names:
+            df = store.read(table, [name])
+            if df.empty:
+                continue
+            if "ErrorCode" in df.columns:
+                df.insert(0, "Error", store.codes.labels(df["ErrorCode"]))
+            out.write(df.to_csv(index=False, header=not header_done).encode())
+            header_done = True
+
+
+def write_range_zip(fileobj, files, store=None, include_tables=False,
+                    on_file=None):
+    # fileobj: any writable binary file (a temp file, an HTTP response, ...)
+    # files: listing dicts (name, full_path).  Returns the names that could
+    # not be downloaded.
+    paths = {f.get("full_path") or f["name"]: f["name"] for f in files}
+    etags = {f.get("full_path") or f["name"]: f.get("etag") for f in files}
+    names = list(paths.values())
+    failed = []
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path, data in supabase_download_many(paths, etags=etags):
+            name = paths[path]
+            if data is None:
+                failed.append(name)
+            else:
+                # .xlsx is already deflated; store it as is
+                zf.writestr(f"files/{name}", data, compress_type=zipfile.ZIP_STORED)
+            if on_file is not None:
+                on_file(name, data is not None)
+
+        if include_tables and store is not None:
+            _write_table_csv(zf, "tables/production.csv", store, PRODUCTION, names)
+            _write_table_csv(zf, "tables/downtime.csv", store, DOWNTIME, names)
+
+        if failed:
+            zf.writestr("MISSING.txt", "\n".join(failed) + "\n")
+    return failed
+
+
+def _remove_expired_exports():
+    cutoff = time.time() - EXPORT_LINK_TTL
+    try:
+        old = []
+        for it in supabase_list_files(EXPORT_PREFIX):
+            # <unix time>-<token>_<file name>, see publish_zip
+            stamp = it["name"].split("-", 1)[0]
+            if stamp.isdigit() and int(stamp) < cutoff:
+                old.append(it["path"])
+        if old:
+            supabase_delete(old)
+    except requests.RequestException:
+        pass    # retried with the next export
+
+
+def publish_zip(zip_path, filename):
+    # -> a signed download link for the ZIP at zip_path, None on failure
+    _remove_expired_exports()
+    path = f"{EXPORT_PREFIX}/{int(time.time())}-{secrets.token_hex(4)}_{filename}"
+    try:
+        with open(zip_path, "rb") as fh:
+            ok = supabase_put_object(fh, path)
+    except requests.RequestException:
+        return None
+    if not ok:
+        return None
+    return supabase_sign_urls([path], expires_in=EXPORT_LINK_TTL).get(path)
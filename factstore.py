@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from downtime_codes import CodeLabels
+from locks import file_lock, file_stamp
+from metrics import count, timer
+from rollups import RollupStore
+
+# -------------------------------------------------------
+#            COLUMNAR FACT STORE (PARQUET)
+# -------------------------------------------------------
+# Normalized production and downtime rows, written once per source
+# workbook and partitioned by date and machine:
+#
+#   <root>/production/date=2025-01-31/machine=GASTI/<source-id>.parquet
+#   <root>/downtime/date=2025-01-31/machine=GASTI/<source-id>.parquet
+#   <root>/_sources.json     source file -> key, date, part files
+#   <root>/_downtime_codes.json  downtime code -> label
+#   <root>/rollups/          daily sums per source (see rollups.py)
+#
+# Parts are never modified in place: re-ingesting a source writes new
+# parts and rollups and then drops the old parts.  A source enters
+# _sources.json only after its parts and rollups are written.  The index
+# is merged and rewritten under _sources.json.lock (see locks.py); inside
+# batch() (one ingest run) new entries are collected and written once at
+# the end and every INDEX_FLUSH_SECONDS, not once per file, so a backfill
+# does not slow down as the index grows.  Until then they are visible to
+# this process only; after a crash their parts are orphaned and the files
+# are simply ingested again.
+# Sources are only dropped all at once (clear, on "Delete ALL"): the pages
+# pick their files from the manifest, so rows of a workbook deleted from
+# the bucket by other means stay on disk but are no longer shown.  Downtime is stored as ErrorCode +
+# minutes; self.codes turns codes back into labels for display.
+
+FACTSTORE_DIR = os.environ.get(
+    "DM_FACTSTORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data", "facts")
+)
+
+READ_THREADS = int(os.environ.get("DM_FACTSTORE_READ_THREADS", 8))
+INDEX_FLUSH_SECONDS = float(os.environ.get("DM_INDEX_FLUSH_SECONDS", 30))
+
+PRODUCTION = "production"
+DOWNTIME = "downtime"
+
+# column holding the machine type in each table
+_MACHINE_COL = {PRODUCTION: "ProductionTypeForTon", DOWNTIME: "MachineType"}
+
+
+def _safe(value):
+    return re.sub(r"[^\w.-]", "_", str(value)) or "_"
+
+
+def _source_id(name):
+    return hashlib.sha1(name.encode()).hexdigest()[:16]
+
+
+class FactStore:
+    def __init__(self, root=FACTSTORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, "_sources.json")
+        self._index_lock = self._index_path + ".lock"
+        self._index_stamp = None
+        self._index = {}
+        self._pending = {}      # entries not yet in _sources.json
+        self._batch = 0
+        self._flushed_at = time.monotonic()
+        self._refresh()
+        self.codes = CodeLabels(os.path.join(self.root, "_downtime_codes.json"))
+
+        self.rollups = RollupStore(self.root)
+        if self._index and not self.rollups.exists():
+            self.rebuild_rollups()
+
+    # ----------------- SOURCE INDEX -----------------
+    def _refresh(self):
+        # pick up writes from other processes (e.g. a running backfill)
+        stamp = file_stamp(self._index_path)
+        if stamp is None or stamp == self._index_stamp:
+            return
+        with self._lock:
+            try:
+                with open(self._index_path, encoding="utf-8") as fh:
+                    self._index = {**json.load(fh), **self._pending}
+                self._index_stamp = stamp
+            except (OSError, ValueError):
+                pass
+
+    def _put(self, name, entry):
+        # caller holds self._lock
+        stale = self._pending.pop(name, {}).get("parts", [])
+        self._pending[name] = self._index[name] = entry
+        self._remove_parts(stale)       # never listed in _sources.json
+        if not self._batch or time.monotonic() - self._flushed_at >= INDEX_FLUSH_SECONDS:
+            self._flush()
+
+    def _flush(self):
+        # caller holds self._lock; merges the pending entries into the
+        # file as it is now and drops the parts they replace
+        if not self._pending:
+            return
+        with file_lock(self._index_lock):
+            try:
+                with open(self._index_path, encoding="utf-8") as fh:
+                    listed = json.load(fh)
+            except (OSError, ValueError):
+                listed = {}
+            old = [p for name in self._pending
+                   for p in listed.get(name, {}).get("parts", [])]
+            self._index = {**listed, **self._pending}
+            tmp = f"{self._index_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(self._index, fh)
+            os.replace(tmp, self._index_path)
+            self._index_stamp = file_stamp(self._index_path)
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._remove_parts(old)
+
+    @contextmanager
+    def batch(self):
+        # collect index writes until the outermost batch ends
+        with self._lock:
+            self._batch += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch -= 1
+                if not self._batch:
+                    self._flush()
+
+    def has(self, name, key=None):
+        self._refresh()
+        entry = self._index.get(name)
+        if entry is None:
+            return False
+        # without listing metadata we cannot tell, so trust what we have
+        return key is None or entry.get("key") == key
+
+    def sources(self):
+        self._refresh()
+        return dict(self._index)
+
+    def describe(self, name, key=None):
+        # row counts and machine types of a stored source, from the part
+        # paths and parquet footers (no data is read); None when the source
+        # is missing or stored from another version
+        if not self.has(name, key):
+            return None
+        out = {"rows": 0, "downtime_rows": 0, "machine_types": set()}
+        for rel in self._index[name]["parts"]:
+            table, _, machine = rel.split("/")[:3]
+            try:
+                n = pq.read_metadata(os.path.join(self.root, rel)).num_rows
+            except (OSError, pa.ArrowInvalid):
+                return None
+            out["rows" if table == PRODUCTION else "downtime_rows"] += n
+            out["machine_types"].add(machine.split("=", 1)[1])
+        out["machine_types"] = sorted(out["machine_types"])
+        return out
+
+    # ----------------- WRITE -----------------
+    def ingest(self, name, file_date, key, prod_df, err_df):
+        with timer("store_write"):
+            self._ingest(name, file_date, key, prod_df, err_df)
+
+    def _ingest(self, name, file_date, key, prod_df, err_df):
+        sid = _source_id(name)
+        stamp = f"{sid}-{time.time_ns()}"
+        if err_df is not None and "Error" in err_df.columns:
+            self.codes.register(err_df)
+            err_df = err_df.drop(columns="Error")
+        day = pd.Timestamp(file_date).date().isoformat()
+
+        parts = []
+        for table, df in ((PRODUCTION, prod_df), (DOWNTIME, err_df)):
+            if df is None or df.empty:
+                continue
+            mcol = _MACHINE_COL[table]
+            for machine, chunk in df.groupby(mcol, sort=False):
+                rel = "/".join([table, f"date={day}", f"machine={_safe(machine)}",
+                                f"{stamp}.parquet"])
+                path = os.path.join(self.root, rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                chunk.to_parquet(path, index=False)
+                parts.append(rel)
+
+        self.rollups.replace(name, prod_df, err_df)
+        with self._lock:
+            self._put(name, {
+                "key": key,
+                "date": day,
+                "parts": parts,
+                "ingested_at": time.time(),
+            })
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            self._index = {}
+            self._pending = {}
+            self._index_stamp = None
+            self.codes = CodeLabels(os.path.join(self.root, "_downtime_codes.json"))
+            self.rollups = RollupStore(self.root)
+
+    def rebuild_rollups(self):
+        names = list(self.sources())
+        self.rollups.rebuild(
+            (name, self.read(PRODUCTION, [name]), self.read(DOWNTIME, [name]))
+            for name in names
+        )
+
+    def _remove_parts(self, parts):
+        for rel in parts:
+            try:
+                os.remove(os.path.join(self.root, rel))
+            except OSError:
+                pass
+
+    # ----------------- READ -----------------
+    def read(self, table, names, columns=None, machines=None):
+        # Only the part files of the requested sources (and machines) are
+        # opened, and only the requested columns are decoded.
+        self._refresh()
+        want = None if machines is None else {f"machine={_safe(m)}" for m in machines}
+        paths = []
+        for name in names:
+            entry = self._index.get(name)
+            if not entry:
+                continue
+            for rel in entry["parts"]:
+                parts = rel.split("/")
+                if parts[0] != table:
+                    continue
+                if want is not None and parts[2] not in want:
+                    continue
+                paths.append(os.path.join(self.root, rel))
+
+        if not paths:
+            return pd.DataFrame()
+
+        def load(path):
+            try:
+                return pq.read_table(path, columns=columns)
+            except (OSError, ValueError, pa.ArrowInvalid):
+                return None
+
+        with timer("store_read", table=table, parts=len(paths)):
+            with ThreadPoolExecutor(max_workers=READ_THREADS) as pool:
+                tables = [t for t in pool.map(load, paths) if t is not None]
+            if not tables:
+                return pd.DataFrame()
+            # int / float columns may differ between workbooks
+            merged = pa.concat_tables(tables, promote_options="permissive")
+            count("rows_read", merged.num_rows)
+            return merged.to_pandas()
+
+
+# -------------------------------------------------------
+#        BACKFILL: python factstore.py backfill
+# -------------------------------------------------------
+def backfill(root=FACTSTORE_DIR, force=False, workers=None):
+    # kept for existing cron jobs; see ingest.py
+    from engine import PARSE_WORKERS
+    from ingest import ingest_bucket
+
+    ingest_bucket(root=root, workers=workers or PARSE_WORKERS, force=force)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Production fact store maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    bf = sub.add_parser("backfill", help="ingest every .xlsx in the uploads bucket")
+    bf.add_argument("--root", default=FACTSTORE_DIR)
+    bf.add_argument("--force", action="store_true", help="re-ingest files already stored")
+    bf.add_argument("--workers", type=int, default=None)
+    rb = sub.add_parser("rebuild-rollups", help="recompute daily rollups from stored facts")
+    rb.add_argument("--root", default=FACTSTORE_DIR)
+    args = ap.parse_args()
+
+    if args.cmd == "backfill":
+        backfill(args.root, force=args.force, workers=args.workers)
+    elif args.cmd == "rebuild-rollups":
+        FactStore(args.root).rebuild_rollups()
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+# -------------------------------------------------------
+#        TREND FIGURES: DOWNSAMPLING AND WEBGL TRACES
+# -------------------------------------------------------
+# Long daily series are reduced on the server with Largest-Triangle-
+# Three-Buckets (LTTB), which keeps the visual shape (peaks and dips)
+# of the line, and drawn as WebGL traces once they are long enough for
+# SVG to slow the browser down.
+
+CHART_MAX_POINTS = int(os.environ.get("DM_CHART_MAX_POINTS", 1000))
+WEBGL_MIN_POINTS = int(os.environ.get("DM_WEBGL_MIN_POINTS", 300))
+MARKERS_MAX_POINTS = 120
+
+
+def lttb(x, y, n_out):
+    # -> sorted indices of the n_out points to keep (x ascending)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # bucket edges for the n - 2 inner points; first and last always stay
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (the last point for the final bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(df, x, y, max_points=CHART_MAX_POINTS):
+    if len(df) <= max_points:
+        return df
+    xs = df[x]
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype("int64")
+    idx = lttb(xs.to_numpy(), df[y].to_numpy(), max_points)
+    return df.iloc[idx]
+
+
+def trend_line(df, x, y, title, max_points=CHART_MAX_POINTS):
+    import plotly.express as px   # only the UI needs plotly
+
+    points = len(df)
+    df = downsample(df, x, y, max_points)
+    fig = px.line(
+        df,
+        x=x, y=y,
+        markers=len(df) <= MARKERS_MAX_POINTS,
+        render_mode="webgl" if len(df) >= WEBGL_MIN_POINTS else "svg",
+        title=title if points == len(df) else f"{title} · {len(df)} of {points} points",
+    )
+    return fig
@@ -0,0 +1,296 @@
+import argparse
+import os
+from datetime import date
+from concurrent.futures import as_completed
+from itertools import chain
+
+from downtime_codes import CodeCollision
+from engine import PARSE_WORKERS, parse_result, submit_parse
+from factstore import FACTSTORE_DIR, FactStore
+from layouts import note_unknown, unknown_report
+from metrics import count, record
+from manifest import Manifest, load_manifest, save_manifest
+from storage import list_all, list_range, name_date, supabase_download_many
+from workbook_cache import make_cache_key
+
+# -------------------------------------------------------
+#          HEADLESS INGESTION PIPELINE (NO STREAMLIT)
+# -------------------------------------------------------
+# Download (or read) workbooks, parse them in the process pool and write
+# the normalized rows to the fact store.  Used by the Streamlit app, the
+# factstore backfill and the command line:
+#
+#   python ingest.py dir  <path>     [--root DIR] [--workers N] [--force]
+#   python ingest.py bucket [--prefix P] [--from D] [--to D] [--root DIR] ...
+#
+# A "file" is a dict with name, full_path (object key or local path),
+# file_date, size and etag (listing metadata; size / etag may be None).
+# file_date is the DDMMYYYY date in the name (storage.name_date), None
+# when it has none: such files are listed but never ingested, as their
+# rows would have no day to be filed under.
+# The name identifies the file everywhere else (caches, fact store), so
+# moving an object to another folder does not re-ingest it.  Problems are
+# returned as messages, never printed or shown, so each caller reports
+# them its own way.
+
+
+def file_key(f):
+    return make_cache_key(f["name"], size=f.get("size"), etag=f.get("etag"))
+
+
+def _bucket_file(it):
+    meta = it.get("metadata") or {}
+    return {
+        "name": it["name"],
+        "full_path": it["path"],
+        "file_date": name_date(it["name"]),
+        "size": meta.get("size"),
+        "etag": meta.get("eTag"),
+    }
+
+
+def bucket_files(prefix="", start=None, end=None):
+    # start / end (dates): list only the month folders they overlap;
+    # without them the whole bucket is walked
+    ranged = start is not None or end is not None
+    if ranged:
+        start, end = start or date.min, end or date.max
+    items = list_range(start, end) if ranged else list_all()
+    files = {}
+    for it in items:
+        if not it["name"].lower().endswith(".xlsx") or not it["path"].startswith(prefix):
+            continue
+        f = _bucket_file(it)
+        if ranged and not (f["file_date"] and start <= f["file_date"] <= end):
+            continue
+        # a flat copy left beside its dated one (not migrated yet): the
+        # dated object wins
+        if f["name"] in files and "/" not in f["full_path"]:
+            continue
+        files[f["name"]] = f
+    return list(files.values())
+
+
+def local_files(directory):
+    # every .xlsx below directory; the modification time stands in for the
+    # eTag so edited files are picked up again
+    files = []
+    for dirpath, _, names in os.walk(directory):
+        for n in sorted(names):
+            if not n.lower().endswith(".xlsx") or n.startswith("~$"):
+                continue
+            path = os.path.join(dirpath, n)
+            info = os.stat(path)
+            files.append({
+                "name": os.path.relpath(path, directory).replace(os.sep, "/"),
+                "full_path": path,
+                "file_date": name_date(n),
+                "size": info.st_size,
+                "etag": str(info.st_mtime_ns),
+            })
+    return files
+
+
+def read_local(files):
+    # fetch function for local_files(): names -> (name, bytes or None)
+    paths = {f["name"]: f["full_path"] for f in files}
+
+    def fetch(names):
+        for name in names:
+            try:
+                with open(paths[name], "rb") as fh:
+                    yield name, fh.read()
+            except OSError:
+                yield name, None
+    return fetch
+
+
+def read_bucket(files):
+    # fetch function for bucket_files(): names -> (name, bytes or None),
+    # downloading each object from its full path
+    paths = {f["name"]: f.get("full_path") or f["name"] for f in files}
+    etags = {paths[f["name"]]: f.get("etag") for f in files}
+
+    def fetch(names):
+        names = {paths[n]: n for n in names}
+        downloads = supabase_download_many(names, etags=etags)
+        try:
+            for path, data in downloads:
+                yield names[path], data
+        finally:
+            downloads.close()
+    return fetch
+
+
+def pending_files(files, store, force=False):
+    # files missing from the store, or stored from another version
+    return [f for f in files if force or not store.has(f["name"], file_key(f))]
+
+
+def _record_parse(res):
+    # timings measured in the worker process (ParseResult.stats)
+    count("files_parsed")
+    stats = res.stats or {}
+    for stage in ("read_excel", "normalize"):
+        if stage in stats:
+            record(stage, stats[stage], file=res.name)
+    count("sheets_parsed", stats.get("sheets", 0))
+    count("rows_produced", stats.get("rows", 0))
+    count("downtime_rows_produced", stats.get("downtime_rows", 0))
+    unknown = stats.get("unknown_layouts")
+    if unknown:
+        note_unknown(unknown)
+        count("unknown_layout_sheets", sum(e["sheets"] for e in unknown.values()))
+    if res.problems:
+        count("files_with_problems")
+
+
+def iter_workbooks(files, cache=None, preloaded=None, fetch=None, workers=PARSE_WORKERS):
+    # Yields (index, (prod_df, err_df, key) or None, problems, stats) for
+    # each file as soon as it is ready, cache hits first (stats: the
+    # ParseResult.stats of a fresh parse, else None).  Closing the generator
+    # cancels the downloads and parses still queued.  fetch defaults to
+    # downloading from the bucket (read_bucket).
+    preloaded = preloaded or {}
+    fetch = fetch or read_bucket(files)
+    keys = {}
+    index = {}
+    pending = {}
+
+    # 1) cache hits: listing metadata (size / eTag) lets us skip the download
+    for i, f in enumerate(files):
+        key = file_key(f)
+        cached = cache.get(f["name"], key) if cache is not None else None
+        if cached is not None:
+            yield i, (*cached, key), [], None
+        else:
+            keys[i] = key
+            index[f["name"]] = i
+
+    def collect(fut):
+        i, file_bytes, fname, fdate = pending.pop(fut)
+        res = parse_result(fut, file_bytes, fname, fdate)
+        _record_parse(res)
+        # files with problems stay uncached so the errors show every time
+        if cache is not None and not res.problems:
+            cache.put(fname, keys[i], res.prod, res.err)
+        return i, (res.prod, res.err, keys[i]), res.problems, res.stats
+
+    # 2) misses: fetch in parallel, hand each file to the parse pool as
+    #    soon as it arrives, and pass on parses as they finish
+    arrivals = [(n, preloaded[n]) for n in index if n in preloaded]
+    to_fetch = [n for n in index if n not in preloaded]
+    downloads = fetch(to_fetch)
+
+    try:
+        for fname, file_bytes in chain(arrivals, downloads):
+            i = index[fname]
+            fdate = files[i]["file_date"]
+
+            if not file_bytes:
+                yield i, None, [f"❌ Could not download {fname}"], None
+                continue
+
+            if keys[i] is None:
+                keys[i] = make_cache_key(fname, content=file_bytes)
+                cached = cache.get(fname, keys[i]) if cache is not None else None
+                if cached is not None:
+                    yield i, (*cached, keys[i]), [], None
+                    continue
+
+            fut = submit_parse(file_bytes, fname, fdate, workers)
+            pending[fut] = (i, file_bytes, fname, fdate)
+
+            for done in [p for p in pending if p.done()]:
+                yield collect(done)
+
+        # 3) the rest of the parses
+        for fut in as_completed(list(pending)):
+            yield collect(fut)
+    finally:
+        if hasattr(downloads, "close"):
+            downloads.close()
+        for fut in pending:
+            fut.cancel()
+
+
+def iter_ingest(files, store, cache=None, preloaded=None, fetch=None, workers=PARSE_WORKERS,
+                manifest=None):
+    # -> (index, r, problems) as iter_workbooks, once each file is written
+    # to the store (and described in the manifest, if one is given).  The
+    # store's index is written once for the whole run (FactStore.batch).
+    with store.batch():
+        for i, r, problems, stats in iter_workbooks(files, cache, preloaded, fetch, workers):
+            if r is not None:
+                prod_df, err_df, key = r
+                try:
+                    store.ingest(files[i]["name"], files[i]["file_date"], key, prod_df, err_df)
+                except CodeCollision as e:
+                    # nothing was written; leave the file out until it is renamed
+                    yield i, None, problems + [f"❌ {files[i]['name']}: {e}"]
+                    continue
+                if manifest is not None:
+                    manifest.record(files[i], prod_df, err_df, stats)
+            yield i, r, problems
+
+
+def run(files, store, fetch=None, workers=PARSE_WORKERS, force=False, log=print,
+        manifest=None):
+    for f in files:
+        if f["file_date"] is None:
+            log(f"skipped, no DDMMYYYY date in the name: {f['name']}")
+    files = [f for f in files if f["file_date"] is not None]
+    todo = pending_files(files, store, force)
+    log(f"{len(todo)} of {len(files)} file(s) to ingest")
+    ok = 0
+    loader = iter_ingest(todo, store, fetch=fetch, workers=workers, manifest=manifest)
+    for done, (i, r, problems) in enumerate(loader, 1):
+        for msg in problems:
+            log(msg)
+        ok += r is not None
+        log(f"[{done}/{len(todo)}] {todo[i]['name']}")
+    log(f"ingested {ok} file(s) into {store.root}")
+    for e in unknown_report():
+        what = e["problem"] or f"missing {', '.join(e['missing'])}"
+        log(f"unknown sheet layout {e['fingerprint']} ({what}): {e['sheets']} sheet(s), "
+            f"e.g. {e['examples'][0]}")
+    return ok
+
+
+def ingest_directory(directory, root=FACTSTORE_DIR, workers=PARSE_WORKERS, force=False):
+    files = local_files(directory)
+    return run(files, FactStore(root), read_local(files), workers, force)
+
+
+def ingest_bucket(prefix="", root=FACTSTORE_DIR, workers=PARSE_WORKERS, force=False,
+                  start=None, end=None):
+    files = bucket_files(prefix, start, end)
+    store = FactStore(root)
+    manifest = load_manifest() or Manifest()
+    if not prefix and start is None and end is None:
+        manifest.sync(files, store)      # a full listing: also drop deleted files
+    ok = run(files, store, read_bucket(files), workers, force, manifest=manifest)
+    save_manifest(manifest)
+    return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Ingest production workbooks into the fact store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("dir", help="ingest every .xlsx below a local directory")
+    d.add_argument("path")
+    b = sub.add_parser("bucket", help="ingest the .xlsx files in the uploads bucket")
+    b.add_argument("--prefix", default="", help="only object keys starting with this (e.g. 2025/)")
+    b.add_argument("--from", dest="start", type=date.fromisoformat, default=None,
+                   help="first file date, YYYY-MM-DD (lists only the months in range)")
+    b.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+    for p in (d, b):
+        p.add_argument("--root", default=FACTSTORE_DIR, help="fact store directory")
+        p.add_argument("--workers", type=int, default=PARSE_WORKERS)
+        p.add_argument("--force", action="store_true", help="re-ingest files already stored")
+    args = ap.parse_args()
+
+    if args.cmd == "dir":
+        ingest_directory(args.path, args.root, args.workers, args.force)
+    else:
+        ingest_bucket(args.prefix, args.root, args.workers, args.force, args.start, args.end)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+
+# -------------------------------------------------------
+#      SHEET TEMPLATES: HEADER FINGERPRINT -> COLUMN PLAN
+# -------------------------------------------------------
+# The header cells of the production block (rows 2–3, D–P) decide which
+# column holds which field.  Thousands of sheets share a handful of
+# templates, so the raw header cells are a dictionary key and the column
+# plan is compiled once per distinct header.  Templates come from
+# layouts.json (or DM_LAYOUTS_CONFIG); each maps header text to the
+# canonical column names, so several template versions can be supported
+# side by side.  A header no template fully covers is compiled with the
+# closest template and reported (unknown_report) rather than failing
+# sheet by sheet.  A sheet whose header cells are all blank (an empty
+# "Sheet1" next to the real ones) gets the BLANK plan: no rows, no report.
+
+LAYOUTS_CONFIG = os.environ.get(
+    "DM_LAYOUTS_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts.json")
+)
+
+# names / index: where each canonical column is in the block;
+# missing: required columns the header lacks (filled with 0);
+# template: None when no template covers the header
+LayoutPlan = namedtuple("LayoutPlan", ["fingerprint", "template", "headers", "names",
+                                       "index", "missing", "problem"])
+BLANK = LayoutPlan(None, None, (), (), (), (), "Blank header")
+
+
+def _text(v):
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    return str(v).strip()
+
+
+def resolve_headers(row2, row3):
+    # row 3 wins, then row 2, else a placeholder
+    headers = []
+    for i, (r2, r3) in enumerate(zip(row2, row3)):
+        r2, r3 = _text(r2), _text(r3)
+        if r3 and r3 != "nan":
+            headers.append(r3)
+        elif r2 and r2 != "nan":
+            headers.append(r2)
+        else:
+            headers.append(f"Col_{i}")
+    return headers
+
+
+class LayoutRegistry:
+    def __init__(self, templates, required):
+        self.templates = list(templates) or [{"name": "default", "columns": {}}]
+        self.required = list(required)
+        self._plans = {}
+
+        raw = json.dumps([self.templates, self.required], sort_keys=True)
+        self.fingerprint = hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path=LAYOUTS_CONFIG):
+        with open(path, encoding="utf-8") as fh:
+            cfg = json.load(fh)
+        return cls(cfg.get("templates", []), cfg.get("required", []))
+
+    def plan(self, row2, row3, width):
+        try:
+            key = (tuple(row2), tuple(row3), width)
+            plan = self._plans.get(key)
+        except TypeError:               # an unhashable cell value
+            key, plan = None, None
+        if plan is None:
+            plan = self._compile(row2, row3, width)
+            if key is not None and len(self._plans) < 10_000:
+                self._plans[key] = plan
+        return plan
+
+    def _compile(self, row2, row3, width):
+        try:
+            if all(_text(v) in ("", "nan") for v in (*row2, *row3)):
+                return BLANK
+            headers = resolve_headers(row2, row3)
+        except Exception as e:
+            return LayoutPlan(None, None, (), (), (), tuple(self.required),
+                              f"Header error: {e}")
+        fp = hashlib.sha1("\x1f".join(headers).encode()).hexdigest()[:12]
+        if len(headers) != width:
+            return LayoutPlan(fp, None, tuple(headers), (), (), tuple(self.required),
+                              "Column mismatch")
+
+        # the template covering most required columns (first one on ties)
+        best = None
+        for t in self.templates:
+            cols = {}
+            for i, h in enumerate(headers):
+                name = t["columns"].get(h, h)
+                if name in self.required and name not in cols:
+                    cols[name] = i
+            if best is None or len(cols) > len(best[1]):
+                best = (t, cols)
+        t, cols = best
+        names = [c for c in self.required if c in cols]
+        return LayoutPlan(
+            fp,
+            t["name"] if len(names) == len(self.required) else None,
+            tuple(headers),
+            tuple(names),
+            tuple(cols[c] for c in names),
+            tuple(c for c in self.required if c not in cols),
+            None,
+        )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_layouts():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LayoutRegistry.from_file()
+        return _registry
+
+
+# -------------------------------------------------------
+#       UNKNOWN TEMPLATES (PROCESS-WIDE, LIKE METRICS)
+# -------------------------------------------------------
+# Parsing runs in worker processes, so each workbook collects its unknown
+# headers in ParseResult.stats["unknown_layouts"] and the caller merges
+# them here.
+
+_unknown_lock = threading.Lock()
+_unknown = {}    # fingerprint -> report entry
+MAX_EXAMPLES = 5
+
+
+def note_sheet(found, plan, filename, sheet_name):
+    # found: the per-workbook dict that travels back in the stats
+    e = found.setdefault(plan.fingerprint, {
+        "fingerprint": plan.fingerprint,
+        "headers": list(plan.headers),
+        "missing": list(plan.missing),
+        "problem": plan.problem,
+        "sheets": 0,
+        "examples": [],
+    })
+    e["sheets"] += 1
+    if len(e["examples"]) < MAX_EXAMPLES:
+        e["examples"].append(f"{filename} / {sheet_name}")
+
+
+def note_unknown(found):
+    with _unknown_lock:
+        for fp, e in (found or {}).items():
+            cur = _unknown.setdefault(fp, dict(e, sheets=0, examples=[]))
+            cur["sheets"] += e["sheets"]
+            room = MAX_EXAMPLES - len(cur["examples"])
+            cur["examples"] += [x for x in e["examples"] if x not in cur["examples"]][:room]
+
+
+def unknown_report():
+    # most frequent first
+    with _unknown_lock:
+        return sorted((dict(e) for e in _unknown.values()), key=lambda e: -e["sheets"])
+
+
+def clear_unknown():
+    with _unknown_lock:
+        _unknown.clear()
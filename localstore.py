@@ -0,0 +1,231 @@
+import argparse
+import email.utils
+import hashlib
+import json
+import os
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+# -------------------------------------------------------
+#     LOCAL STAND-IN FOR THE SUPABASE STORAGE HTTP API
+# -------------------------------------------------------
+# Serves one directory as the "uploads" bucket with the endpoints
+# storage.py uses (list, get, put/post, move, delete, sign).  Objects carry an
+# ETag (MD5 of the content, as in Supabase) and Last-Modified and honour
+# If-None-Match / If-Modified-Since, so the mirror's revalidation can be
+# exercised without a network:
+#
+#   python localstore.py <dir> [--port 54321]
+#   DM_SUPABASE_URL=http://127.0.0.1:54321 streamlit run app.py
+
+BUCKET = "uploads"
+_OBJECT = f"/storage/v1/object/{BUCKET}/"
+_SIGNED = f"/storage/v1/object/sign/{BUCKET}/"
+
+
+def _etag(path):
+    h = hashlib.md5()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return f'"{h.hexdigest()}"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    root = "."
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ----------------- helpers -----------------
+    def _path(self, name):
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(name)
+        return path
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    # ----------------- GET: object download -----------------
+    def do_GET(self):
+        url = urlparse(self.path)
+        for prefix in (_OBJECT, _SIGNED):
+            if url.path.startswith(prefix):
+                return self._send_object(unquote(url.path[len(prefix):]))
+        self._json(404, {"error": "not_found"})
+
+    def _send_object(self, name):
+        try:
+            path = self._path(name)
+        except ValueError:
+            return self._json(400, {"error": "invalid_key"})
+        if not os.path.isfile(path):
+            return self._json(404, {"error": "not_found", "message": "Object not found"})
+
+        etag = _etag(path)
+        mtime = os.path.getmtime(path)
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+        inm = self.headers.get("If-None-Match")
+        ims = self.headers.get("If-Modified-Since")
+        not_modified = inm == etag if inm else False
+        if not inm and ims:
+            try:
+                not_modified = int(mtime) <= email.utils.parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                pass
+        if not_modified:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        with open(path, "rb") as fh:
+            data = fh.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(data)
+
+    # ----------------- PUT / POST: upload, list, sign -----------------
+    def do_PUT(self):
+        url = urlparse(self.path)
+        if not url.path.startswith(_OBJECT):
+            return self._json(404, {"error": "not_found"})
+        name = unquote(url.path[len(_OBJECT):])
+        try:
+            path = self._path(name)
+        except ValueError:
+            return self._json(400, {"error": "invalid_key"})
+        data = self._body()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{threading.get_ident()}"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        self._json(200, {"Key": f"{BUCKET}/{name}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == f"/storage/v1/object/list/{BUCKET}":
+            return self._list(json.loads(self._body() or b"{}"))
+        if url.path == f"/storage/v1/object/sign/{BUCKET}":
+            return self._sign(json.loads(self._body() or b"{}"))
+        if url.path == "/storage/v1/object/move":
+            return self._move(json.loads(self._body() or b"{}"))
+        return self.do_PUT()
+
+    def _list(self, req):
+        # one folder level, like the real API: sub-folders come back as
+        # entries without metadata
+        prefix = req.get("prefix", "").strip("/")
+        limit = int(req.get("limit", 100))
+        offset = int(req.get("offset", 0))
+        folder = os.path.join(self.root, prefix) if prefix else self.root
+        items = []
+        if os.path.isdir(folder):
+            for n in sorted(os.listdir(folder)):
+                p = os.path.join(folder, n)
+                if ".tmp-" in n:
+                    continue
+                if os.path.isdir(p):
+                    items.append({"name": n, "id": None, "metadata": None})
+                    continue
+                st = os.stat(p)
+                items.append({
+                    "name": n,
+                    "id": hashlib.sha1(p.encode()).hexdigest(),
+                    "updated_at": email.utils.formatdate(st.st_mtime, usegmt=True),
+                    "metadata": {
+                        "size": st.st_size,
+                        "eTag": _etag(p),
+                        "mimetype": "application/octet-stream",
+                        "lastModified": email.utils.formatdate(st.st_mtime, usegmt=True),
+                    },
+                })
+        self._json(200, items[offset:offset + limit])
+
+    def _move(self, req):
+        # like the real API: the destination must not exist yet
+        try:
+            src = self._path(req.get("sourceKey", ""))
+            dst = self._path(req.get("destinationKey", ""))
+        except ValueError:
+            return self._json(400, {"error": "invalid_key"})
+        if not os.path.isfile(src):
+            return self._json(404, {"error": "not_found", "message": "Object not found"})
+        if os.path.exists(dst):
+            return self._json(400, {"error": "Duplicate", "message": "The resource already exists"})
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.replace(src, dst)
+        self._json(200, {"message": "Successfully moved"})
+
+    def _sign(self, req):
+        out = []
+        for name in req.get("paths", []):
+            try:
+                ok = os.path.isfile(self._path(name))
+            except ValueError:
+                ok = False
+            out.append({
+                "path": name,
+                "signedURL": f"/object/sign/{BUCKET}/{name}?token=local" if ok else None,
+                "error": None if ok else "Either the object does not exist or you do not have access to it",
+            })
+        self._json(200, out)
+
+    # ----------------- DELETE -----------------
+    def do_DELETE(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != f"/storage/v1/object/{BUCKET}":
+            return self._json(404, {"error": "not_found"})
+        removed = []
+        for name in json.loads(self._body() or b"{}").get("prefixes", []):
+            try:
+                path = self._path(name)
+            except ValueError:
+                continue
+            if os.path.isfile(path):
+                os.remove(path)
+                removed.append({"name": name})
+            elif os.path.isdir(path):
+                shutil.rmtree(path)
+                removed.append({"name": name})
+        self._json(200, removed)
+
+
+def serve(root, host="127.0.0.1", port=0):
+    # -> (server, base URL); the server runs in a daemon thread
+    os.makedirs(root, exist_ok=True)
+    handler = type("Handler", (_Handler,), {"root": os.path.abspath(root)})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serve a directory as the uploads bucket")
+    ap.add_argument("root")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=54321)
+    args = ap.parse_args()
+    server, url = serve(args.root, args.host, args.port)
+    print(f"serving {args.root} at {url}  (set DM_SUPABASE_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
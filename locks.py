@@ -0,0 +1,39 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # Windows: no inter-process lock, threads only
+    fcntl = None
+
+# -------------------------------------------------------
+#         FILE LOCKS SHARED BY SEVERAL PROCESSES
+# -------------------------------------------------------
+# The fact store's small shared files (_sources.json, the downtime
+# labels) are read, changed and written back whole.  The app and
+# command-line backfills may do that at the same time, so every
+# read-modify-write holds an exclusive flock on "<file>.lock" and re-reads
+# the file once it has the lock.  flock also blocks other threads of the
+# same process, as each call opens its own descriptor.
+
+
+@contextmanager
+def file_lock(path):
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)    # releases the lock
+
+
+def file_stamp(path):
+    # changes with every os.replace, even within one mtime tick
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_ino, st.st_size
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+# -------------------------------------------------------
+#                 MACHINE-TYPE REGISTRY
+# -------------------------------------------------------
+# Name patterns -> machine type -> grams per pack, loaded from
+# machines.json (or DM_MACHINES_CONFIG).  Patterns are case-insensitive
+# substrings checked in file order, so earlier machines win.  A new line,
+# e.g. a 500cc filler, only needs a new entry in the config.
+
+MACHINES_CONFIG = os.environ.get(
+    "DM_MACHINES_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "machines.json")
+)
+
+
+class MachineRegistry:
+    def __init__(self, machines, default_type="Unknown", default_grams=1000):
+        self.machines = list(machines)
+        self.default_type = default_type
+        self.default_grams = default_grams
+        self.grams = {m["type"]: m["grams_per_pack"] for m in self.machines}
+        self.grams.setdefault(default_type, default_grams)
+
+        # one compiled matcher: each alternative is a lookahead at position
+        # 0, so alternatives are tried in priority order, not leftmost-first
+        alts = []
+        self._types = []
+        for i, m in enumerate(self.machines):
+            pats = "|".join(re.escape(p.lower()) for p in m["patterns"])
+            alts.append(f"(?=.*?(?:{pats}))(?P<m{i}>)")
+            self._types.append(m["type"])
+        self._matcher = re.compile("|".join(alts), re.DOTALL) if alts else None
+        self._memo = {}
+
+        raw = json.dumps([self.machines, default_type, default_grams], sort_keys=True)
+        self.fingerprint = hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, path=MACHINES_CONFIG):
+        with open(path, encoding="utf-8") as fh:
+            cfg = json.load(fh)
+        default = cfg.get("default", {})
+        return cls(
+            cfg.get("machines", []),
+            default_type=default.get("type", "Unknown"),
+            default_grams=default.get("grams_per_pack", 1000),
+        )
+
+    def classify(self, name):
+        s = str(name).lower()
+        hit = self._memo.get(s)
+        if hit is not None:
+            return hit
+
+        mtype = self.default_type
+        if self._matcher is not None:
+            m = self._matcher.match(s)
+            if m:
+                mtype = self._types[int(m.lastgroup[1:])]
+
+        if len(self._memo) < 10_000:
+            self._memo[s] = mtype
+        return mtype
+
+    def grams_per_pack(self, mtype):
+        return self.grams.get(mtype, self.default_grams)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MachineRegistry.from_file()
+        return _registry
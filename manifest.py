@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import requests
+
+from metrics import count, timer
+from storage import name_date, supabase_download_file, supabase_upload_file
+from workbook_cache import make_cache_key
+
+# -------------------------------------------------------
+#          BUCKET MANIFEST (ONE OBJECT, SORTED INDEX)
+# -------------------------------------------------------
+# _manifest.json in the uploads bucket describes every workbook:
+#
+#   name, path (object key), date (from the name, null when it has none),
+#   machine_types, size, etag, md5, sheets, rows, downtime_rows
+#
+# It is updated whenever files are ingested (upload, first view, the
+# ingest CLI) and reset by "Delete ALL".  Entries only leave it through a
+# full sync (Re-scan bucket, manifest.py rebuild, ingest.py bucket without
+# a range): an object deleted from the bucket by other means stays listed
+# until then.  In memory the dated entries are
+# kept sorted by (date, name), so a date range is two binary searches and
+# the cost of a selection is known before anything is downloaded.
+# Parse fields (sheets, rows, ...) are None until a file is ingested.
+#
+# Several writers (app replicas, the CLIs) keep their own copy, so a save
+# re-reads the bucket's copy and applies only this copy's changes since
+# its last save; an entry written elsewhere more recently wins.  Storage
+# has no conditional writes, so the short window between that read and
+# the upload is the only race left.
+#
+#   python manifest.py rebuild [--root DIR]   re-sync with the bucket
+
+MANIFEST_NAME = os.environ.get("DM_MANIFEST_NAME", "_manifest.json")
+VERSION = 1
+
+
+def _md5(etag):
+    # single-part uploads: the eTag is the MD5 of the content
+    tag = (etag or "").strip('"').lower()
+    return tag if len(tag) == 32 else None
+
+
+class Manifest:
+    def __init__(self, entries=None):
+        self._lock = threading.Lock()
+        self.entries = dict(entries or {})
+        self.dirty = False
+        self._saved()
+        self._reindex()
+
+    # ----------------- INDEX -----------------
+    def _reindex(self):
+        # revision: changes with the content, for cache keys
+        self.revision = time.time_ns()
+        dated = sorted((e["date"], n) for n, e in self.entries.items() if e.get("date"))
+        self._dates = [d for d, _ in dated]
+        self._names = [n for _, n in dated]
+        self._undated = sorted(n for n, e in self.entries.items() if not e.get("date"))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def between(self, start, end):
+        # entries dated start..end (inclusive), in (date, name) order
+        lo = bisect_left(self._dates, start.isoformat())
+        hi = bisect_right(self._dates, end.isoformat())
+        return [self.entries[n] for n in self._names[lo:hi]]
+
+    def bounds(self):
+        if not self._dates:
+            return None
+        return date.fromisoformat(self._dates[0]), date.fromisoformat(self._dates[-1])
+
+    def undated(self):
+        return [self.entries[n] for n in self._undated]
+
+    # ----------------- UPDATES -----------------
+    def _saved(self):
+        # changes not yet written to the bucket (see merged)
+        self._changed = set()
+        self._removed = set()
+        self._cleared = False
+
+    def _put(self, name, entry):
+        self.entries[name] = entry
+        self._changed.add(name)
+        self._removed.discard(name)
+        self.dirty = True
+
+    def _drop(self, name):
+        if self.entries.pop(name, None) is not None:
+            self._removed.add(name)
+            self._changed.discard(name)
+            self.dirty = True
+
+    def _entry(self, f, prod_df=None, err_df=None, stats=None, described=None):
+        # -> the new entry for f, None when nothing changed
+        old = self.entries.get(f["name"], {})
+        same = old.get("etag") == f.get("etag")
+        d = name_date(f["name"])
+        entry = {
+            "name": f["name"],
+            "path": f.get("full_path") or f["name"],
+            "date": d.isoformat() if d else None,
+            "size": f.get("size"),
+            "etag": f.get("etag"),
+            "md5": _md5(f.get("etag")),
+            "machine_types": old.get("machine_types") if same else None,
+            "sheets": old.get("sheets") if same else None,
+            "rows": old.get("rows") if same else None,
+            "downtime_rows": old.get("downtime_rows") if same else None,
+        }
+        if prod_df is not None and err_df is not None:
+            machines = set()
+            if "ProductionTypeForTon" in prod_df.columns:
+                machines.update(prod_df["ProductionTypeForTon"].astype(str).unique())
+            if "MachineType" in err_df.columns:
+                machines.update(err_df["MachineType"].astype(str).unique())
+            entry.update(machine_types=sorted(machines), rows=len(prod_df),
+                         downtime_rows=len(err_df))
+        if described:
+            entry.update(described)
+        if stats and "sheets" in stats:
+            entry["sheets"] = stats["sheets"]
+        if entry == {k: v for k, v in old.items() if k != "updated_at"}:
+            return None
+        entry["updated_at"] = time.time()
+        return entry
+
+    def record(self, f, prod_df=None, err_df=None, stats=None, described=None):
+        # f: a listing dict (ingest.bucket_files); parse fields come from
+        # the frames / ParseResult.stats, or from FactStore.describe()
+        entry = self._entry(f, prod_df, err_df, stats, described)
+        if entry is None:
+            return
+        with self._lock:
+            self._put(f["name"], entry)
+            self._reindex()
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+            self._saved()
+            self._cleared = True
+            self.dirty = True
+            self._reindex()
+
+    def sync(self, files, store=None):
+        # match a full listing: drop objects that are gone, add new ones,
+        # keep parse fields of unchanged files; stored sources fill in what
+        # is missing without a download
+        listed = {f["name"]: f for f in files}
+        with self._lock:
+            for name in [n for n in self.entries if n not in listed]:
+                self._drop(name)
+            for name, f in listed.items():
+                described = None
+                old = self.entries.get(name, {})
+                if store is not None and (old.get("rows") is None
+                                          or old.get("etag") != f.get("etag")):
+                    key = make_cache_key(name, size=f.get("size"), etag=f.get("etag"))
+                    described = store.describe(name, key)
+                entry = self._entry(f, described=described)
+                if entry is not None:
+                    self._put(name, entry)
+            self._reindex()
+
+    def merged(self, remote):
+        # -> the entries to write: remote (the bucket's copy, None when it
+        # has none) with this copy's changes since the last save applied
+        if remote is None:
+            return dict(self.entries)
+        out = {} if self._cleared else dict(remote.entries)
+        for name in self._removed:
+            out.pop(name, None)
+        for name in self._changed:
+            mine, theirs = self.entries.get(name), out.get(name)
+            if mine is None:
+                continue
+            if theirs is None or (theirs.get("updated_at") or 0) <= (mine.get("updated_at") or 0):
+                out[name] = mine
+        return out
+
+    # ----------------- COST OF A SELECTION -----------------
+    @staticmethod
+    def cost(entries):
+        known = [e for e in entries if e.get("rows") is not None]
+        machines = set()
+        for e in known:
+            machines.update(e.get("machine_types") or [])
+        return {
+            "files": len(entries),
+            "bytes": sum(e.get("size") or 0 for e in entries),
+            "rows": sum(e["rows"] for e in known),
+            "downtime_rows": sum(e.get("downtime_rows") or 0 for e in known),
+            "sheets": sum(e.get("sheets") or 0 for e in known),
+            "machine_types": sorted(machines),
+            "unparsed": len(entries) - len(known),
+        }
+
+    # ----------------- (DE)SERIALIZATION -----------------
+    def to_bytes(self, entries=None):
+        entries = self.entries if entries is None else entries
+        payload = {"version": VERSION, "files": sorted(entries.values(),
+                                                        key=lambda e: e["name"])}
+        return json.dumps(payload, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(data)
+        if payload.get("version") != VERSION:
+            return cls()
+        return cls({e["name"]: e for e in payload.get("files", [])})
+
+
+# ----------------- BUCKET I/O -----------------
+def entry_file(e):
+    # manifest entry -> the file dict the ingest pipeline works with
+    return {
+        "name": e["name"],
+        "full_path": e["path"],
+        "file_date": date.fromisoformat(e["date"]),
+        "size": e.get("size"),
+        "etag": e.get("etag"),
+    }
+
+
+def load_manifest():
+    # -> Manifest, or None when the bucket has none yet.  Other writers
+    # rewrite it in place, so a mirrored copy is always revalidated.
+    with timer("manifest_load"):
+        data = supabase_download_file(MANIFEST_NAME, revalidate=True)
+    if not data:
+        return None
+    try:
+        return Manifest.from_bytes(data)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def save_manifest(manifest, force=False):
+    # merges with the bucket's current copy (see Manifest.merged), which
+    # then becomes this copy
+    if not (manifest.dirty or force):
+        return True
+    remote = load_manifest()
+    with manifest._lock:
+        entries = manifest.merged(remote)
+        try:
+            with timer("manifest_save"):
+                ok = supabase_upload_file(manifest.to_bytes(entries), MANIFEST_NAME)
+        except requests.RequestException:
+            ok = False
+        count("manifest_saves")
+        if ok:
+            manifest.entries = entries
+            manifest.dirty = False
+            manifest._saved()
+            manifest._reindex()
+        # otherwise kept in memory; the next save retries
+    return ok
+
+
+def rebuild_manifest(files, store=None, manifest=None):
+    manifest = manifest or load_manifest() or Manifest()
+    manifest.sync(files, store)
+    save_manifest(manifest, force=True)
+    return manifest
+
+
+if __name__ == "__main__":
+    from factstore import FACTSTORE_DIR, FactStore
+    from ingest import bucket_files
+
+    ap = argparse.ArgumentParser(description="Uploads bucket manifest")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="re-sync the manifest with a full bucket listing")
+    rb.add_argument("--root", default=FACTSTORE_DIR, help="fact store to take row counts from")
+    args = ap.parse_args()
+
+    if args.cmd == "rebuild":
+        m = rebuild_manifest(bucket_files(), FactStore(args.root))
+        c = Manifest.cost(list(m.entries.values()))
+        print(f"{c['files']} file(s), {c['bytes'] / 1e6:.1f} MB, {c['rows']} rows, "
+              f"{c['unparsed']} not parsed yet, {len(m.undated())} without a date")
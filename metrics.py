@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# -------------------------------------------------------
+#          STAGE TIMERS AND COUNTERS (PROCESS-WIDE)
+# -------------------------------------------------------
+# Cheap enough to leave on: a lock and a few additions per event.
+#   with timer("download"): ...        -> calls / total / max seconds
+#   count("bytes_downloaded", n)       -> monotonically increasing total
+# Every finished stage is also logged as one JSON line on the
+# "dm.metrics" logger (printed to stderr when DM_METRICS_LOG=1), and
+# prometheus_text() renders the totals in the Prometheus text format.
+# Parsing runs in worker processes, so its timings travel back in
+# ParseResult.stats and are recorded here by the caller.
+
+log = logging.getLogger("dm.metrics")
+if os.environ.get("DM_METRICS_LOG") and not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_stages = {}     # stage -> [calls, total_seconds, max_seconds]
+_counters = {}   # name -> total
+
+
+def record(stage, seconds, **fields):
+    with _lock:
+        s = _stages.setdefault(stage, [0, 0.0, 0.0])
+        s[0] += 1
+        s[1] += seconds
+        s[2] = max(s[2], seconds)
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps({"ts": round(time.time(), 3), "stage": stage,
+                             "seconds": round(seconds, 6), **fields}, default=str))
+
+
+@contextmanager
+def timer(stage, **fields):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t, **fields)
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot():
+    with _lock:
+        return {
+            "stages": {k: {"calls": v[0], "seconds": v[1], "max": v[2]}
+                       for k, v in _stages.items()},
+            "counters": dict(_counters),
+        }
+
+
+def diff(after, before):
+    # what happened between two snapshots (e.g. during one page run)
+    stages = {}
+    for k, v in after["stages"].items():
+        b = before["stages"].get(k, {"calls": 0, "seconds": 0.0})
+        if v["calls"] != b["calls"]:
+            stages[k] = {"calls": v["calls"] - b["calls"],
+                         "seconds": v["seconds"] - b["seconds"]}
+    counters = {k: v - before["counters"].get(k, 0)
+                for k, v in after["counters"].items()
+                if v != before["counters"].get(k, 0)}
+    return {"stages": stages, "counters": counters}
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def prometheus_text(prefix="dm"):
+    snap = snapshot()
+    lines = [
+        f"# HELP {prefix}_stage_calls_total Completed runs of each stage.",
+        f"# TYPE {prefix}_stage_calls_total counter",
+    ]
+    lines += [f'{prefix}_stage_calls_total{{stage="{k}"}} {v["calls"]}'
+              for k, v in sorted(snap["stages"].items())]
+    lines += [
+        f"# HELP {prefix}_stage_seconds_total Time spent in each stage.",
+        f"# TYPE {prefix}_stage_seconds_total counter",
+    ]
+    lines += [f'{prefix}_stage_seconds_total{{stage="{k}"}} {v["seconds"]:.6f}'
+              for k, v in sorted(snap["stages"].items())]
+    lines += [
+        f"# HELP {prefix}_stage_seconds_max Longest single run of each stage.",
+        f"# TYPE {prefix}_stage_seconds_max gauge",
+    ]
+    lines += [f'{prefix}_stage_seconds_max{{stage="{k}"}} {v["max"]:.6f}'
+              for k, v in sorted(snap["stages"].items())]
+    for k, v in sorted(snap["counters"].items()):
+        lines += [f"# TYPE {prefix}_{k}_total counter", f"{prefix}_{k}_total {v}"]
+    return "\n".join(lines) + "\n"
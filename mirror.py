@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from metrics import count
+
+# -------------------------------------------------------
+#        LOCAL MIRROR OF THE UPLOADS BUCKET (REVALIDATING)
+# -------------------------------------------------------
+# Objects are kept on disk with the ETag / Last-Modified they were served
+# with.  A copy younger than DM_MIRROR_MAX_AGE seconds is used as is;
+# an older one is revalidated with a conditional GET (If-None-Match /
+# If-Modified-Since), so an unchanged object costs a 304 and no body.
+# When the bucket cannot be reached, the last copy is served.  A caller
+# that knows the object's current ETag (from a listing or the manifest)
+# passes it, and a copy with another ETag is revalidated however young it
+# is.  The mirror is trimmed to DM_MIRROR_MAX_BYTES, least recently used
+# first: the size is tracked as objects are stored, and the directory is
+# only scanned when it is over quota (then trimmed to 90%).
+#
+#   <root>/<sha1(name)>/body
+#   <root>/<sha1(name)>/meta.json   name, etag, last_modified, checked_at
+
+MIRROR_DIR = os.environ.get(
+    "DM_MIRROR_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "mirror")
+)
+MIRROR_MAX_AGE = float(os.environ.get("DM_MIRROR_MAX_AGE", 60))
+MIRROR_MAX_BYTES = int(os.environ.get("DM_MIRROR_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def _same_etag(a, b):
+    return (a or "").strip('"').lower() == (b or "").strip('"').lower()
+
+
+class BucketMirror:
+    def __init__(self, root=MIRROR_DIR, max_age=MIRROR_MAX_AGE, max_bytes=MIRROR_MAX_BYTES):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None      # running total, counted on first store
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_dir(self, name):
+        return os.path.join(self.root, hashlib.sha1(name.encode()).hexdigest())
+
+    def _meta(self, name):
+        try:
+            with open(os.path.join(self._entry_dir(name), "meta.json"), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _body(self, name):
+        try:
+            with open(os.path.join(self._entry_dir(name), "body"), "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def _write_meta(self, name, meta):
+        d = self._entry_dir(name)
+        tmp = os.path.join(d, f"meta.json.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, os.path.join(d, "meta.json"))
+
+    def _store(self, name, body, headers):
+        d = self._entry_dir(name)
+        os.makedirs(d, exist_ok=True)
+        tmp = os.path.join(d, f"body.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp, "wb") as fh:
+            fh.write(body)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan()[0]
+            self._bytes += len(body) - _size(os.path.join(d, "body"))
+            os.replace(tmp, os.path.join(d, "body"))
+            over = self._bytes > self.max_bytes
+        self._write_meta(name, {
+            "name": name,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": len(body),
+            "checked_at": time.time(),
+        })
+        if over:
+            self._evict()
+
+    def get(self, name, fetch, etag=None, revalidate=False):
+        # fetch(extra_headers) -> (status, body, headers), or None when the
+        # bucket could not be reached; etag: the ETag the object should have;
+        # revalidate: always ask the bucket (objects rewritten in place)
+        meta = self._meta(name)
+        body = self._body(name) if meta else None
+        fresh = (body is not None and not revalidate
+                 and time.time() - meta.get("checked_at", 0) < self.max_age)
+        if fresh and etag and not _same_etag(etag, meta.get("etag")):
+            count("mirror_etag_mismatch")
+            fresh = False
+        if fresh:
+            count("mirror_fresh_hits")
+            self._touch(name)
+            return body
+
+        headers = {}
+        if body is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        res = fetch(headers)
+        if res is None:
+            if body is not None:
+                count("mirror_stale_served")
+            return body
+
+        status, data, resp_headers = res
+        if status == 304 and body is not None:
+            count("mirror_revalidated")
+            meta["checked_at"] = time.time()
+            self._write_meta(name, meta)
+            return body
+        if status == 200:
+            count("mirror_fetched")
+            self._store(name, data, resp_headers)
+            return data
+        if status in (400, 404):
+            self.invalidate(name)     # gone from the bucket
+        return None
+
+    def put(self, name, body, headers=None):
+        self._store(name, body, headers or {})
+
+    def _touch(self, name):
+        try:
+            os.utime(os.path.join(self._entry_dir(name), "body"))
+        except OSError:
+            pass
+
+    def invalidate(self, name):
+        d = self._entry_dir(name)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes -= _size(os.path.join(d, "body"))
+            shutil.rmtree(d, ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            self._bytes = 0
+
+    def _scan(self):
+        # -> (total bytes, [(last read, bytes, entry)]); also corrects the
+        # running total for objects stored by other processes
+        entries = []
+        total = 0
+        for entry in os.listdir(self.root):
+            try:
+                st = os.stat(os.path.join(self.root, entry, "body"))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry))
+            total += st.st_size
+        return total, entries
+
+    def _evict(self):
+        # disk quota: drop least recently read objects first, down to 90%
+        with self._lock:
+            total, entries = self._scan()
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes * 0.9:
+                    break
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+                total -= size
+                count("mirror_evictions")
+            self._bytes = total
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,454 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, time as datetime_time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from downtime_codes import CodeCollision, get_reasons
+from excel_reader import iter_sheet_blocks
+from layouts import BLANK, get_layouts, note_sheet
+from machines import get_registry
+from schema import compact_downtime, compact_production
+
+# Parsed result of one workbook.  "problems" replaces the inline st.error
+# calls so parsing can run outside the Streamlit thread (see engine.py).
+# "stats" carries the stage timings back from the worker (see metrics.py).
+ParseResult = namedtuple("ParseResult", ["name", "prod", "err", "problems", "stats"],
+                         defaults=[None])
+
+
+# ===================================================================
+#                        CONVERSION HELPERS
+# ===================================================================
+
+def convert_time(val):
+    if pd.isna(val):
+        return 0
+    if isinstance(val, datetime_time):
+        return val.hour + val.minute / 60
+    if isinstance(val, datetime):
+        return val.hour + val.minute / 60
+    if isinstance(val, (int, float)):
+        if 0 <= val < 1:
+            return val * 24
+        try:
+            h = int(val) // 100
+            m = int(val) % 100
+            if 0 <= m < 60:
+                return (h % 24) + m/60
+        except:
+            pass
+        return float(val)
+    if isinstance(val, str):
+        s = val.strip()
+        if ":" in s:
+            try:
+                t = datetime.strptime(s, "%H:%M:%S")
+                return t.hour + t.minute/60
+            except:
+                try:
+                    t = datetime.strptime(s, "%H:%M")
+                    return t.hour + t.minute/60
+                except:
+                    pass
+        if s.isdigit():
+            try:
+                v = int(s)
+                h = v//100
+                m = v%100
+                if 0 <= m < 60:
+                    return (h % 24) + m/60
+            except:
+                pass
+        try:
+            return float(s)
+        except:
+            return 0
+    return 0
+
+
+def convert_duration_to_minutes(val):
+    if pd.isna(val):
+        return 0
+    if isinstance(val, timedelta):
+        return val.total_seconds()/60
+    if isinstance(val, datetime):
+        return val.hour*60 + val.minute
+    if isinstance(val, datetime_time):
+        return val.hour*60 + val.minute
+    if isinstance(val, (int, float)):
+        if 0 <= val < 1:
+            return val * 24 * 60
+        if val < 2400:
+            try:
+                h = int(val) // 100
+                m = int(val) % 100
+                if 0 <= m < 60:
+                    return h*60 + m
+            except:
+                pass
+        return val*60
+    if isinstance(val, str):
+        s = val.strip()
+        if ":" in s:
+            try:
+                t = datetime.strptime(s, "%H:%M:%S")
+                return t.hour*60 + t.minute
+            except:
+                try:
+                    t = datetime.strptime(s, "%H:%M")
+                    return t.hour*60 + t.minute
+                except:
+                    pass
+        if s.isdigit():
+            try:
+                v = int(s)
+                h = v//100
+                m = v%100
+                if 0 <= m < 60:
+                    return h*60 + m
+            except:
+                pass
+        try:
+            return float(s)*60
+        except:
+            return 0
+    return 0
+
+
+# ===================================================================
+#             VECTORIZED (SERIES) VERSIONS OF THE HELPERS
+# ===================================================================
+# Same results as convert_time / convert_duration_to_minutes applied per
+# cell.  Values are grouped by type and each group is converted with array
+# operations; anything outside the common shapes (odd strings, unicode
+# digits, huge numbers, unknown types) goes through the scalar function.
+
+# below this many cells Series.apply is cheaper than the setup
+_VECTOR_MIN_ROWS = 32
+
+# strptime's %H / %M / %S patterns (seconds 60/61 fail in strptime),
+# ASCII digits only, surrounded by what str.strip() would remove
+_WS = r"[ \t\n\r\x0b\x0c]*"
+_HMS_RE = (_WS + r"(?P<h>2[0-3]|[01][0-9]|[0-9]):(?P<m>[0-5][0-9]|[0-9])"
+           r"(?::(?:[0-5][0-9]|[0-9]))?" + _WS)
+_DIGITS_RE = _WS + r"(?P<d>[0-9]{1,15})" + _WS
+_MAX_EXACT = 1e15
+
+
+def _split_by_kind(values):
+    kinds = np.fromiter(map(type, values), dtype=object, count=len(values))
+    is_na = pd.isna(values)
+    is_int = (kinds == int) & ~is_na
+    is_num = is_int | ((kinds == float) & ~is_na)
+    is_str = kinds == str
+    is_time = kinds == datetime_time
+    is_dt = ((kinds == datetime) | (kinds == pd.Timestamp)) & ~is_na
+    is_td = ((kinds == timedelta) | (kinds == pd.Timedelta)) & ~is_na
+    return is_na, is_int, is_num, is_str, is_time, is_dt, is_td
+
+
+def _clock_minutes(values, is_time):
+    # minutes since midnight for time / datetime objects
+    out = np.empty(len(values), dtype=np.int64)
+    if is_time.any():
+        t = values[is_time]
+        out[is_time] = np.fromiter((v.hour * 60 + v.minute for v in t), np.int64, len(t))
+    if (~is_time).any():
+        dt = values[~is_time].astype("datetime64[us]")
+        out[~is_time] = (dt - dt.astype("datetime64[D]")).astype("timedelta64[m]").astype(np.int64)
+    return out
+
+
+def _parse_strings(values):
+    # -> (hh, mm, matched) for "HH:MM[:SS]" and (digits, is_digits) for HHMM
+    arr = pa.array(values, type=pa.string())
+    hms = pc.extract_regex(arr, "^" + _HMS_RE + "$")
+    dig = pc.extract_regex(arr, "^" + _DIGITS_RE + "$")
+
+    matched = pc.is_valid(hms).to_numpy(zero_copy_only=False)
+    is_digits = pc.is_valid(dig).to_numpy(zero_copy_only=False)
+
+    def ints(struct, field):
+        col = pc.struct_field(struct, field)
+        return pc.cast(pc.fill_null(col, "0"), pa.int64()).to_numpy(zero_copy_only=False)
+
+    return ints(hms, "h"), ints(hms, "m"), matched, ints(dig, "d"), is_digits
+
+
+def _hhmm_parts(v):
+    # int(val) // 100, int(val) % 100 for float arrays
+    with np.errstate(invalid="ignore"):
+        iv = np.trunc(v)
+        return np.floor_divide(iv, 100), np.mod(iv, 100)
+
+
+def _finish(series, out, is_float, fallback, scalar_fn):
+    if fallback.any():
+        fb = series[fallback].map(scalar_fn)
+        if fb.dtype == object:
+            # ints beyond int64 - let pandas infer exactly as apply does
+            return series.apply(scalar_fn)
+        out[fallback] = fb.to_numpy(dtype=float)
+        is_float[fallback] = fb.dtype.kind == "f"
+    res = pd.Series(out, index=series.index, name=series.name)
+    # Series.apply gives int64 when every cell came back as a Python int
+    if not is_float.any():
+        res = res.astype(np.int64)
+    return res
+
+
+def convert_time_series(series):
+    if len(series) < _VECTOR_MIN_ROWS:
+        return series.apply(convert_time)
+
+    values = series.to_numpy(dtype=object)
+    n = len(values)
+    out = np.zeros(n, dtype=float)
+    is_float = np.zeros(n, dtype=bool)
+    fallback = np.zeros(n, dtype=bool)
+    is_na, is_int, is_num, is_str, is_time, is_dt, is_td = _split_by_kind(values)
+
+    # time / datetime objects
+    clock = is_time | is_dt
+    if clock.any():
+        mins = _clock_minutes(values[clock], is_time[clock])
+        out[clock] = mins // 60 + (mins % 60) / 60
+        is_float[clock] = True
+
+    # numbers: Excel fractional days, HHMM integers, anything else as is
+    if is_num.any():
+        v = values[is_num].astype(float)
+        was_int = is_int[is_num]
+        ok = np.isfinite(v) & (np.abs(v) < _MAX_EXACT)
+        frac = (v >= 0) & (v < 1)
+        h, m = _hhmm_parts(v)
+        hhmm = ~frac & (m < 60)
+        res = np.where(frac, v * 24, np.where(hhmm, np.mod(h, 24) + m / 60, v))
+        flt = np.where(frac, ~was_int, True)
+
+        idx = np.flatnonzero(is_num)
+        out[idx[ok]] = res[ok]
+        is_float[idx[ok]] = flt[ok]
+        fallback[idx[~ok]] = True
+
+    # strings: "HH:MM[:SS]" and HHMM digit strings
+    if is_str.any():
+        hh, mm, matched, dv, digits = _parse_strings(values[is_str])
+        h, m = dv // 100, dv % 100
+        res = np.where(matched, hh + mm / 60,
+                       np.where(m < 60, (h % 24) + m / 60, dv.astype(float)))
+
+        idx = np.flatnonzero(is_str)
+        ok = matched | digits
+        out[idx[ok]] = res[ok]
+        is_float[idx[ok]] = True
+        fallback[idx[~ok]] = True
+
+    # NaN is 0 (int); timedelta and unknown types go through the scalar path
+    fallback |= ~(is_na | is_num | is_str | clock)
+    return _finish(series, out, is_float, fallback, convert_time)
+
+
+def convert_duration_series(series):
+    if len(series) < _VECTOR_MIN_ROWS:
+        return series.apply(convert_duration_to_minutes)
+
+    values = series.to_numpy(dtype=object)
+    n = len(values)
+    out = np.zeros(n, dtype=float)
+    is_float = np.zeros(n, dtype=bool)
+    fallback = np.zeros(n, dtype=bool)
+    is_na, is_int, is_num, is_str, is_time, is_dt, is_td = _split_by_kind(values)
+
+    # timedelta objects (float minutes)
+    if is_td.any():
+        try:
+            us = values[is_td].astype("timedelta64[us]").astype(np.int64)
+            out[is_td] = us / 1e6 / 60
+            is_float[is_td] = True
+        except (ValueError, OverflowError):
+            fallback |= is_td
+
+    # time / datetime objects (int minutes)
+    clock = is_time | is_dt
+    if clock.any():
+        out[clock] = _clock_minutes(values[clock], is_time[clock])
+
+    # numbers: Excel fractional days, HHMM below 2400, otherwise hours
+    if is_num.any():
+        v = values[is_num].astype(float)
+        was_int = is_int[is_num]
+        ok = np.isfinite(v) & (np.abs(v) < _MAX_EXACT)
+        frac = (v >= 0) & (v < 1)
+        h, m = _hhmm_parts(v)
+        hhmm = ~frac & (v < 2400) & (m < 60)
+        res = np.where(frac, v * 24 * 60, np.where(hhmm, h * 60 + m, v * 60))
+        flt = np.where(hhmm, False, ~was_int)
+
+        idx = np.flatnonzero(is_num)
+        out[idx[ok]] = res[ok]
+        is_float[idx[ok]] = flt[ok]
+        fallback[idx[~ok]] = True
+
+    # strings: "HH:MM[:SS]" and HHMM digit strings (int minutes)
+    if is_str.any():
+        hh, mm, matched, dv, digits = _parse_strings(values[is_str])
+        h, m = dv // 100, dv % 100
+        res = np.where(matched, hh * 60 + mm,
+                       np.where(m < 60, h * 60 + m, dv * 60.0))
+
+        idx = np.flatnonzero(is_str)
+        ok = matched | digits
+        out[idx[ok]] = res[ok]
+        is_float[idx[ok]] = ~matched[ok] & (m[ok] >= 60)
+        fallback[idx[~ok]] = True
+
+    fallback |= ~(is_na | is_num | is_str | clock | is_td)
+    return _finish(series, out, is_float, fallback, convert_duration_to_minutes)
+
+
+def determine_machine_type(name):
+    return get_registry().classify(name)
+
+
+# ===================================================================
+#                  READ PRODUCTION (CORE FUNCTION)
+# ===================================================================
+def read_production_data(block, filename, sheet_name, file_date, unknown=None):
+    # block = cells D2:P9 from excel_reader (rows 2–3 headers, 4–9 data).
+    # The header → column plan is compiled once per distinct header (see
+    # layouts.py); unknown headers are collected in `unknown`.
+    plan = get_layouts().plan(block[0], block[1], block.shape[1])
+    if plan is BLANK:
+        return pd.DataFrame()
+    if plan.template is None and unknown is not None:
+        note_sheet(unknown, plan, filename, sheet_name)
+    if plan.problem:
+        return pd.DataFrame()
+
+    # Data rows 4–9: only the planned columns, missing ones filled with 0
+    data = pd.DataFrame(block[2:8][:, list(plan.index)], columns=list(plan.names))
+    for col in plan.missing:
+        data[col] = 0
+
+    # Add Date
+    data["Date"] = file_date
+
+    # Machine type
+    mtype = determine_machine_type(sheet_name)
+    if mtype == "Unknown":
+        mtype = determine_machine_type(filename)
+    data["ProductionTypeForTon"] = mtype
+
+    # Clean product text
+    data["Product"] = data["Product"].astype(str).str.strip().str.title()
+    data = data[data["Product"] != ""]
+
+    # Convert start/end times
+    data["StartTime"] = convert_time_series(data["Start"])
+    data["EndTime"] = convert_time_series(data["End"])
+
+    # Midnight fix
+    data["EndTimeAdj"] = np.where(
+        data["EndTime"] < data["StartTime"], data["EndTime"] + 24, data["EndTime"]
+    )
+
+    data["Duration"] = data["EndTimeAdj"] - data["StartTime"]
+    data = data[data["Duration"] > 0]
+
+    # Convert numerics
+    data["PackQty"] = pd.to_numeric(data["PackQty"], errors="coerce").fillna(0)
+    data["Waste"] = pd.to_numeric(data["Waste"], errors="coerce").fillna(0)
+    data["Capacity"] = pd.to_numeric(data["Capacity"], errors="coerce").fillna(0)
+    data["Manpower"] = pd.to_numeric(data["Manpower"], errors="coerce").fillna(0)
+
+    # Ton calculation (one machine type per sheet)
+    grams = get_registry().grams_per_pack(mtype)
+    data["Ton"] = (data["PackQty"] * grams) / 1_000_000
+
+    data["PotentialProduction"] = data["Capacity"] * data["Duration"]
+    data["Efficiency(%)"] = np.where(
+        data["PotentialProduction"] > 0,
+        (data["PackQty"] / data["PotentialProduction"]) * 100,
+        0
+    )
+
+    final_cols = ["Date", "Product", "Capacity", "Manpower",
+                  "Duration", "PackQty", "Waste", "Ton",
+                  "PotentialProduction", "Efficiency(%)", "ProductionTypeForTon"]
+
+    return data[final_cols]
+
+
+# ===================================================================
+#                    READ ERRORS (CORE FUNCTION)
+# ===================================================================
+def read_error_data(block, sheet_name, filename, file_date):
+    # block = cells G12:H<last used row> from excel_reader.  Reasons are
+    # canonicalized once per distinct text into integer codes (see
+    # downtime_codes.py) and summed per code.
+    try:
+        raw = pd.DataFrame(block, columns=["Error", "Duration"])
+    except:
+        return pd.DataFrame()
+
+    codes, labels = get_reasons().encode(raw["Error"].to_numpy())
+    raw = raw.assign(ErrorCode=codes)[codes >= 0]
+
+    raw["Duration"] = convert_duration_series(raw["Duration"])
+
+    agg = raw.groupby("ErrorCode")["Duration"].sum().reset_index()
+    agg.insert(0, "Error", agg["ErrorCode"].map(labels))
+    agg["Date"] = file_date
+    agg["MachineType"] = determine_machine_type(sheet_name)
+
+    return agg
+
+
+# ===================================================================
+#      SINGLE WORKBOOK PARSER (LOOP THROUGH EXCEL SHEETS)
+# ===================================================================
+def parse_workbook(file_bytes, fname, fdate):
+    all_prod = []
+    all_err = []
+    problems = []
+    stats = {"read_excel": 0.0, "normalize": 0.0, "sheets": 0}
+    unknown = {}
+
+    try:
+        # one streaming pass over the workbook, only the cell ranges we use
+        t = time.perf_counter()
+        for sheet, prod_block, err_block in iter_sheet_blocks(file_bytes):
+            t_read = time.perf_counter()
+            stats["read_excel"] += t_read - t
+            prod_df = read_production_data(prod_block, fname, sheet, fdate, unknown)
+            err_df = read_error_data(err_block, sheet, fname, fdate)
+
+            if not prod_df.empty:
+                all_prod.append(prod_df)
+            if not err_df.empty:
+                all_err.append(err_df)
+            t = time.perf_counter()
+            stats["normalize"] += t - t_read
+            stats["sheets"] += 1
+    except CodeCollision as e:
+        return ParseResult(fname, pd.DataFrame(), pd.DataFrame(),
+                           [f"❌ {fname}: {e}"], stats)
+    except Exception:
+        return ParseResult(fname, pd.DataFrame(), pd.DataFrame(),
+                           [f"❌ Invalid Excel file: {fname}"], stats)
+
+    t = time.perf_counter()
+    prod = pd.concat(all_prod, ignore_index=True) if all_prod else pd.DataFrame()
+    err = pd.concat(all_err, ignore_index=True) if all_err else pd.DataFrame()
+    prod, err = compact_production(prod), compact_downtime(err)
+    stats["normalize"] += time.perf_counter() - t
+    stats["rows"] = len(prod)
+    stats["downtime_rows"] = len(err)
+    if unknown:
+        stats["unknown_layouts"] = unknown
+    return ParseResult(fname, prod, err, problems, stats)
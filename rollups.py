@@ -0,0 +1,164 @@
+import glob
+import hashlib
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from locks import file_stamp
+from metrics import timer
+
+# -------------------------------------------------------
+#             DAILY ROLLUPS (DAY x PRODUCT x MACHINE)
+# -------------------------------------------------------
+# Per-source daily sums kept next to the fact store, one small file per
+# source and table:
+#
+#   <root>/rollups/production/<source-id>.arrow
+#   <root>/rollups/downtime/<source-id>.arrow
+#
+# Replacing a source writes only its own file (os.replace, so readers see
+# the old or the new rows, never half), which keeps an ingest constant-time
+# however many sources are stored and needs no lock between processes.
+# Reads concatenate the files of the requested sources; each file is
+# loaded once and kept until its stamp changes.  The files are Arrow IPC
+# rather than parquet: a dashboard opens one per day shown, and a tiny
+# parquet file costs ~1.5 ms to open against ~0.1 ms.
+# Weekly / monthly / yearly views are built from these, never from raw rows.
+
+PROD_KEYS = ["Date", "Product", "ProductionTypeForTon"]
+PROD_SUMS = ["Ton", "PackQty", "Waste", "PotentialProduction"]
+ERR_KEYS = ["Date", "MachineType", "ErrorCode"]
+ERR_SUMS = ["Duration"]
+
+
+def daily_production(prod_df):
+    if prod_df is None or prod_df.empty:
+        return pd.DataFrame(columns=PROD_KEYS + PROD_SUMS + ["Rows"])
+    prod_df = _wide_sums(prod_df, PROD_SUMS)
+    out = prod_df.groupby(PROD_KEYS, sort=False, observed=True)[PROD_SUMS].sum()
+    out["Rows"] = prod_df.groupby(PROD_KEYS, sort=False, observed=True).size()
+    return _plain_keys(out.reset_index())
+
+
+def daily_downtime(err_df):
+    if err_df is None or err_df.empty:
+        return pd.DataFrame(columns=ERR_KEYS + ERR_SUMS)
+    err_df = _wide_sums(err_df, ERR_SUMS)
+    out = err_df.groupby(ERR_KEYS, sort=False, observed=True)[ERR_SUMS].sum()
+    return _plain_keys(out.reset_index())
+
+
+def _wide_sums(df, columns):
+    # facts use narrow types (see schema.py); totals must not overflow
+    # or lose precision
+    df = df.copy(deep=False)
+    for col in columns:
+        kind = df[col].dtype.kind
+        df[col] = df[col].astype("int64" if kind in "iu" else "float64")
+    return df
+
+
+def _plain_keys(df):
+    # rollups are small; plain strings keep them easy to merge across sources
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str)
+    return df
+
+
+def resample_sums(daily, freq, columns):
+    # daily rollup -> one row per period with summed columns
+    if daily.empty:
+        return pd.DataFrame(columns=["Date"] + list(columns))
+    with timer("resample", freq=freq):
+        df = daily[["Date"] + list(columns)].copy()
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df.set_index("Date").resample(freq)[list(columns)].sum().reset_index()
+
+
+class RollupStore:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._dir = os.path.join(root, "rollups")
+        self._cache = {}        # path -> (file stamp, arrow table)
+
+    def exists(self):
+        return os.path.isdir(self._dir)
+
+    def _path(self, table, source):
+        name = hashlib.sha1(source.encode()).hexdigest()[:16]
+        return os.path.join(self._dir, table, f"{name}.arrow")
+
+    def _write(self, table, source, df):
+        path = self._path(table, source)
+        if df.empty:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+        df["Source"] = source
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp)
+        os.replace(tmp, path)
+
+    def _load(self, path):
+        stamp = file_stamp(path)
+        with self._lock:
+            hit = self._cache.get(path)
+            if stamp is None:
+                self._cache.pop(path, None)
+                return None
+            if hit is not None and hit[0] == stamp:
+                return hit[1]
+        try:
+            data = feather.read_table(path)
+        except (OSError, ValueError, pa.ArrowInvalid):
+            return None
+        with self._lock:
+            self._cache[path] = (stamp, data)
+        return data
+
+    def replace(self, source, prod_df, err_df):
+        with timer("rollup_update"):
+            self._write("production", source, daily_production(prod_df))
+            self._write("downtime", source, daily_downtime(err_df))
+
+    def rebuild(self, per_source):
+        # per_source: iterable of (source, prod_df, err_df); files of
+        # sources not listed are dropped
+        keep = set()
+        for source, prod_df, err_df in per_source:
+            self.replace(source, prod_df, err_df)
+            keep.update(self._path(t, source) for t in ("production", "downtime"))
+        os.makedirs(self._dir, exist_ok=True)
+        for path in glob.glob(os.path.join(self._dir, "*", "*.arrow")):
+            if path not in keep:
+                os.remove(path)
+        # single-file rollups of older versions
+        for old in ("rollup_production.parquet", "rollup_downtime.parquet", "rollup.lock"):
+            try:
+                os.remove(os.path.join(self.root, old))
+            except OSError:
+                pass
+
+    def read(self, table, names=None, machines=None):
+        # names=None reads every stored source
+        if names is None:
+            paths = sorted(glob.glob(os.path.join(self._dir, table, "*.arrow")))
+        else:
+            paths = [self._path(table, n) for n in dict.fromkeys(names)]
+        tables = [t for t in map(self._load, paths) if t is not None]
+        if not tables:
+            return pd.DataFrame()
+        # int / float sums may differ between workbooks
+        df = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+        if machines is not None:
+            mcol = "ProductionTypeForTon" if table == "production" else "MachineType"
+            df = df[df[mcol].isin(list(machines))].reset_index(drop=True)
+        return df
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# -------------------------------------------------------
+#       COMPACT SCHEMA FOR PRODUCTION / DOWNTIME FRAMES
+# -------------------------------------------------------
+# Repeated strings (products, machines, error texts) are categoricals,
+# dates are datetime64 and numbers use the smallest type that holds them:
+#   "count"   -> smallest integer type when every value is whole,
+#                float32 otherwise
+#   float32   -> derived measures (hours, tons, percentages)
+# Arithmetic in parsing.py is done at full precision; only the finished
+# frames are narrowed.  The schema survives the parquet round trip of the
+# fact store (categoricals are stored dictionary-encoded).
+
+DATE = "datetime64[ms]"
+
+PRODUCTION_SCHEMA = {
+    "Date": DATE,
+    "Product": "category",
+    "Capacity": "count",
+    "Manpower": "count",
+    "Duration": "float32",
+    "PackQty": "count",
+    "Waste": "count",
+    "Ton": "float32",
+    "PotentialProduction": "float32",
+    "Efficiency(%)": "float32",
+    "ProductionTypeForTon": "category",
+}
+
+DOWNTIME_SCHEMA = {
+    "Error": "category",
+    "ErrorCode": "int32",
+    "Duration": "float32",
+    "Date": DATE,
+    "MachineType": "category",
+}
+
+
+def _count(s):
+    s = pd.to_numeric(s, errors="coerce")
+    values = s.to_numpy(dtype="float64", na_value=np.nan)
+    if len(values) and np.isfinite(values).all() and (values == np.round(values)).all():
+        return pd.to_numeric(s, downcast="integer")
+    return s.astype("float32")
+
+
+def apply_schema(df, schema):
+    if df is None or df.empty:
+        return df
+    out = df.copy()
+    for col, kind in schema.items():
+        if col not in out.columns:
+            continue
+        if kind == "count":
+            out[col] = _count(out[col])
+        elif kind == "category":
+            out[col] = out[col].astype(str).astype("category")
+        elif kind == DATE:
+            out[col] = pd.to_datetime(out[col]).astype(DATE)
+        else:
+            out[col] = pd.to_numeric(out[col], errors="coerce").astype(kind)
+    return out
+
+
+def compact_production(df):
+    return apply_schema(df, PRODUCTION_SCHEMA)
+
+
+def compact_downtime(df):
+    return apply_schema(df, DOWNTIME_SCHEMA)
+
+
+def concat_frames(frames):
+    # pd.concat turns categoricals with different categories into object
+    # columns; align the categories first so the result stays compact.
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    frames = [f.copy(deep=False) for f in frames]
+    for col in frames[0].columns:
+        if not all(isinstance(f.get(col, None), pd.Series)
+                   and isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        cats = union_categoricals([f[col].array for f in frames]).categories
+        for f in frames:
+            f[col] = f[col].cat.set_categories(cats)
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(frames):
+    # frames: {label: DataFrame} -> one row per column with its dtype and size
+    rows = []
+    for label, df in frames.items():
+        if df is None or df.empty:
+            continue
+        usage = df.memory_usage(index=False, deep=True)
+        for col in df.columns:
+            rows.append({
+                "Table": label,
+                "Column": col,
+                "Type": str(df[col].dtype),
+                "MB": usage[col] / 1e6,
+            })
+    return pd.DataFrame(rows, columns=["Table", "Column", "Type", "MB"])
@@ -0,0 +1,109 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from parsing import (
+    _VECTOR_MIN_ROWS,
+    convert_duration_series,
+    convert_duration_to_minutes,
+    convert_time,
+    convert_time_series,
+)
+
+# Property: the vectorized converters give exactly what Series.apply with
+# the per-cell function gives (values, dtype and index) for any mix of
+# cell types a workbook can hold.  Series are drawn from a seeded
+# generator so a failure is reproducible from its seed.
+
+STRINGS = [
+    "", " ", "abc", "1.5", "nan", "inf", "1e3", "-20", "²", "0.25", "1_000",
+    "99999999999999999999", " 7:5 ", "12:30\n", "1:2:3:4", "24:00", "١٢:٣٠", "٣٠",
+]
+
+
+def _cell(rng):
+    k = rng.randrange(16)
+    if k == 0:
+        return None
+    if k == 1:
+        return float("nan")
+    if k == 2:
+        return rng.randint(-3000, 5000)
+    if k == 3:
+        return rng.uniform(-5, 3000)
+    if k == 4:
+        return rng.random()
+    if k == 5:
+        return time(rng.randrange(24), rng.randrange(60), rng.randrange(60),
+                    rng.choice([0, 5000]))
+    if k == 6:
+        return datetime(rng.choice([1899, 1900, 2024]), rng.randint(1, 12), 1,
+                        rng.randrange(24), rng.randrange(60))
+    if k == 7:
+        return timedelta(minutes=rng.uniform(0, 3000))
+    if k == 8:
+        return rng.choice([
+            "%d:%02d" % (rng.randrange(30), rng.randrange(70)),
+            "%d:%d:%d" % (rng.randrange(25), rng.randrange(61), rng.randrange(62)),
+        ])
+    if k == 9:
+        return str(rng.randint(0, 99999)).zfill(rng.choice([1, 4]))
+    if k == 10:
+        return rng.choice(STRINGS)
+    if k == 11:
+        return rng.choice([True, False])
+    if k == 12:
+        return rng.choice([float("inf"), 1e300, -1e16, 2 ** 70])
+    if k == 13:
+        return pd.Timestamp("2024-05-05 13:45")
+    if k == 14:
+        return rng.choice([0, 0.0, 1, 2399, 2400, 59, 60, 160, -100])
+    return rng.choice([pd.NaT, np.float64(0.5), date(2024, 1, 1)])
+
+
+def _series(rng):
+    # mostly long enough for the vectorized path, some short ones
+    n = rng.randint(_VECTOR_MIN_ROWS, 80) if rng.random() < 0.8 else rng.randint(0, 12)
+    cells = [_cell(rng) for _ in range(n)]
+    if cells and rng.random() < 0.3:
+        cells = [cells[0]] * n      # a single type / value throughout
+    return pd.Series(cells, dtype=object, index=np.arange(100, 100 + n))
+
+
+CONVERTERS = [
+    (convert_time, convert_time_series),
+    (convert_duration_to_minutes, convert_duration_series),
+]
+
+
+@pytest.mark.parametrize("scalar, vectorized", CONVERTERS)
+@pytest.mark.parametrize("seed", range(20))
+def test_series_matches_apply(scalar, vectorized, seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        s = _series(rng)
+        pd.testing.assert_series_equal(vectorized(s), s.apply(scalar), check_exact=True)
+
+
+@pytest.mark.parametrize("scalar, vectorized", CONVERTERS)
+@pytest.mark.parametrize("seed", range(5))
+def test_named_series_keeps_its_name(scalar, vectorized, seed):
+    rng = random.Random(seed)
+    for _ in range(20):
+        s = _series(rng).rename("Start")
+        pd.testing.assert_series_equal(vectorized(s), s.apply(scalar), check_exact=True)
+
+
+@pytest.mark.parametrize("scalar, vectorized", CONVERTERS)
+@pytest.mark.parametrize("seed", range(5))
+def test_string_dtype_matches_apply(scalar, vectorized, seed):
+    # read_error_data gets Duration as pandas' str dtype, with missing cells
+    rng = random.Random(seed)
+    for _ in range(20):
+        n = rng.randint(_VECTOR_MIN_ROWS, 80)
+        cells = [None if rng.random() < 0.1 else str(_cell(rng)) for _ in range(n)]
+        s = pd.Series(cells, dtype="str", name="Duration")
+        pd.testing.assert_series_equal(vectorized(s), s.apply(scalar), check_exact=True)
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from dataset_cache import DatasetCache
+
+
+def _frame():
+    return pd.DataFrame({"Product": ["A", "B", "C"], "Ton": [1.0, 2.0, 3.0]})
+
+
+def _start(target, n=1):
+    out = [None] * n
+
+    def run(i):
+        try:
+            out[i] = target()
+        except BaseException as e:
+            out[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, out
+
+
+def _join(threads):
+    for t in threads:
+        t.join(timeout=10)
+        assert not t.is_alive()
+
+
+def _in_flight(cache, key):
+    # wait until a computation for key is running
+    for _ in range(1000):
+        if key in cache._inflight:
+            return
+        time.sleep(0.001)
+    raise AssertionError(f"{key!r} never started")
+
+
+def test_concurrent_callers_share_one_compute():
+    cache = DatasetCache()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(10)
+        return _frame()
+
+    owner, first = _start(lambda: cache.get_or_compute("k", compute))
+    _in_flight(cache, "k")
+    waiters, rest = _start(lambda: cache.get_or_compute("k", compute), n=8)
+    time.sleep(0.05)
+    release.set()
+    _join(owner + waiters)
+
+    assert len(calls) == 1
+    for df in first + rest:
+        pd.testing.assert_frame_equal(df, _frame())
+    assert cache.stats()["misses"] == 1
+
+
+def test_waiters_take_over_when_the_owner_fails():
+    cache = DatasetCache()
+    release = threading.Event()
+    calls = []
+
+    def failing():
+        release.wait(10)
+        raise RuntimeError("session reran")
+
+    def compute():
+        calls.append(1)
+        return _frame()
+
+    owner, first = _start(lambda: cache.get_or_compute("k", failing))
+    _in_flight(cache, "k")
+    waiters, rest = _start(lambda: cache.get_or_compute("k", compute), n=4)
+    time.sleep(0.05)
+    release.set()
+    _join(owner + waiters)
+
+    assert isinstance(first[0], RuntimeError)
+    assert len(calls) == 1       # one waiter recomputes, the others wait for it
+    for df in rest:
+        pd.testing.assert_frame_equal(df, _frame())
+    assert cache.stats()["entries"] == 1
+
+
+def test_waiters_take_over_when_a_batch_owner_fails():
+    cache = DatasetCache()
+    release = threading.Event()
+
+    def failing(keys):
+        release.wait(10)
+        raise RuntimeError("session reran")
+
+    owner, first = _start(lambda: cache.get_or_compute_many(["a", "b"], failing))
+    _in_flight(cache, "b")
+    waiters, rest = _start(lambda: cache.get_or_compute("b", lambda: _frame()))
+    time.sleep(0.05)
+    release.set()
+    _join(owner + waiters)
+
+    assert isinstance(first[0], RuntimeError)
+    pd.testing.assert_frame_equal(rest[0], _frame())
+    assert not cache._inflight
+
+
+def test_declined_values_are_returned_but_not_kept():
+    cache = DatasetCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return _frame()
+
+    for _ in range(2):
+        pd.testing.assert_frame_equal(cache.get_or_compute("k", compute, keep=lambda: False),
+                                      _frame())
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+    cache.get_or_compute("k", compute, keep=lambda: True)
+    cache.get_or_compute("k", compute)
+    assert len(calls) == 3
+
+
+def test_batch_keep_decides_per_key():
+    cache = DatasetCache()
+    asked = []
+
+    def compute_missing(keys):
+        asked.append(sorted(keys))
+        return {k: _frame() for k in keys}
+
+    keep = lambda key: key != "b"
+    assert sorted(cache.get_or_compute_many(["a", "b"], compute_missing, keep)) == ["a", "b"]
+    cache.get_or_compute_many(["a", "b"], compute_missing, keep)
+    assert asked == [["a", "b"], ["b"]]
+
+
+def test_writes_to_a_returned_frame_stay_private():
+    cache = DatasetCache()
+    source = _frame()
+    cache.get_or_compute("k", lambda: source)
+
+    mine = cache.get_or_compute("k", pytest.fail)
+    mine.loc[0, "Ton"] = 99.0
+    mine["Ton"] *= 2
+    mine["Extra"] = 1
+
+    pd.testing.assert_frame_equal(cache.get_or_compute("k", pytest.fail), _frame())
+    pd.testing.assert_frame_equal(source, _frame())
+
+
+def test_frames_in_tuples_are_isolated_too():
+    cache = DatasetCache()
+    cache.get_or_compute("k", lambda: (_frame(), _frame()))
+
+    prod, err = cache.get_or_compute("k", pytest.fail)
+    prod.loc[1, "Product"] = "Z"
+    err.drop(columns="Ton", inplace=True)
+
+    again = cache.get_or_compute("k", pytest.fail)
+    pd.testing.assert_frame_equal(again[0], _frame())
+    pd.testing.assert_frame_equal(again[1], _frame())
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from downtime_codes import CodeCollision, CodeLabels, ReasonTable, reason_code
+
+# two different reasons whose 31-bit codes are equal
+A, B = "reason 11722", "reason 17200"
+
+
+def _err(labels):
+    table = ReasonTable()
+    return pd.DataFrame({"Error": labels,
+                         "ErrorCode": [table.canonical(l)[0] for l in labels]})
+
+
+def test_pair_collides():
+    assert reason_code(A) == reason_code(B)
+
+
+def test_spellings_share_a_code():
+    table = ReasonTable({"power failure": "Power Off"})
+    codes, labels = table.encode(["Power Off", " power  off", "POWER FAILURE", None])
+    assert codes[:3].tolist() == [reason_code("power off")] * 3
+    assert codes[3] == -1
+    assert labels == {reason_code("power off"): "Power Off"}
+
+
+def test_encode_rejects_a_collision():
+    with pytest.raises(CodeCollision):
+        ReasonTable().encode([A, "Power Off", B])
+
+
+def test_alias_resolves_a_collision():
+    codes, labels = ReasonTable({B: "Reason B"}).encode([A, B])
+    assert codes[0] != codes[1]
+
+
+def test_register_rejects_a_collision_across_files(tmp_path):
+    path = str(tmp_path / "_downtime_codes.json")
+    CodeLabels(path).register(_err([A]))
+    labels = CodeLabels(path)
+    with pytest.raises(CodeCollision):
+        labels.register(_err(["Power Off", B]))
+    # nothing of the rejected frame was kept
+    assert CodeLabels(path).labels([reason_code("power off")]) == [f"#{reason_code('power off')}"]
+    assert labels.labels([reason_code(A)]) == [A]
+
+
+def test_register_keeps_the_first_spelling(tmp_path):
+    path = str(tmp_path / "_downtime_codes.json")
+    CodeLabels(path).register(_err(["Power Off"]))
+    labels = CodeLabels(path)
+    labels.register(_err(["power  OFF", "Setup"]))
+    code = reason_code("power off")
+    assert CodeLabels(path).labels([code, reason_code("setup")]) == ["Power Off", "Setup"]
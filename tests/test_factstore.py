@@ -0,0 +1,70 @@
+import glob
+import json
+import os
+
+import pandas as pd
+
+from factstore import DOWNTIME, PRODUCTION, FactStore
+
+
+def _prod(day, tons):
+    return pd.DataFrame({
+        "Date": pd.Timestamp(day),
+        "Product": ["A", "B"][:len(tons)],
+        "Capacity": 1.0, "Manpower": 2, "Duration": 10.0, "PackQty": 5,
+        "Waste": 0.5, "Ton": tons, "PotentialProduction": 2.0,
+        "Efficiency(%)": 50.0, "ProductionTypeForTon": "GASTI",
+    })
+
+
+def _listed(root):
+    with open(os.path.join(root, "_sources.json"), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _parts_on_disk(root):
+    return sorted(os.path.relpath(p, root)
+                  for p in glob.glob(os.path.join(root, "*", "date=*", "machine=*", "*.parquet")))
+
+
+def test_batch_writes_the_index_once_at_the_end(tmp_path):
+    root = str(tmp_path)
+    store = FactStore(root)
+    with store.batch():
+        store.ingest("a_01012025.xlsx", "2025-01-01", "k1", _prod("2025-01-01", [1.0, 2.0]), None)
+        store.ingest("b_02012025.xlsx", "2025-01-02", "k2", _prod("2025-01-02", [3.0]), None)
+        # visible here at once, in _sources.json only after the batch
+        assert store.has("a_01012025.xlsx", "k1")
+        assert not os.path.exists(os.path.join(root, "_sources.json"))
+    assert sorted(_listed(root)) == ["a_01012025.xlsx", "b_02012025.xlsx"]
+    assert FactStore(root).has("b_02012025.xlsx", "k2")
+
+
+def test_reingest_replaces_parts_and_rollups(tmp_path):
+    root = str(tmp_path)
+    store = FactStore(root)
+    store.ingest("a_01012025.xlsx", "2025-01-01", "k1", _prod("2025-01-01", [1.0, 2.0]), None)
+    with store.batch():
+        store.ingest("a_01012025.xlsx", "2025-01-01", "k2", _prod("2025-01-01", [4.0]), None)
+        store.ingest("a_01012025.xlsx", "2025-01-01", "k3", _prod("2025-01-01", [5.0]), None)
+    listed = _listed(root)["a_01012025.xlsx"]
+    assert listed["key"] == "k3"
+    assert _parts_on_disk(root) == sorted(listed["parts"])
+
+    other = FactStore(root)
+    assert other.read(PRODUCTION, ["a_01012025.xlsx"])["Ton"].tolist() == [5.0]
+    assert other.rollups.read(PRODUCTION, ["a_01012025.xlsx"])["Ton"].tolist() == [5.0]
+    assert other.rollups.read(DOWNTIME, ["a_01012025.xlsx"]).empty
+
+
+def test_rollups_of_an_older_store_are_rebuilt(tmp_path):
+    root = str(tmp_path)
+    FactStore(root).ingest("a_01012025.xlsx", "2025-01-01", "k1",
+                           _prod("2025-01-01", [1.0, 2.0]), None)
+    # single-file rollups of older versions
+    os.rename(os.path.join(root, "rollups"), os.path.join(root, "gone"))
+    open(os.path.join(root, "rollup_production.parquet"), "wb").close()
+
+    store = FactStore(root)
+    assert store.rollups.read(PRODUCTION)["Ton"].sum() == 3.0
+    assert not os.path.exists(os.path.join(root, "rollup_production.parquet"))
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+import localstore
+import storage
+from manifest import Manifest, load_manifest, save_manifest
+from mirror import BucketMirror
+
+# Two writers (app replicas, the CLIs) each hold their own Manifest and
+# save into one bucket, served locally by localstore.  Each test loads both
+# copies before either saves, the overlap a real deployment has.
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    server, url = localstore.serve(str(tmp_path / "bucket"))
+    monkeypatch.setattr(storage, "SUPABASE_URL", url)
+    monkeypatch.setattr(storage, "_mirror", BucketMirror(root=str(tmp_path / "mirror")))
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def _file(day, etag="e1"):
+    name = f"prod_{day}012025.xlsx"
+    return {"name": name, "full_path": f"2025/01/{name}", "size": 10, "etag": etag}
+
+
+def _writers(*files):
+    # two copies of the same saved manifest
+    base = Manifest()
+    for f in files:
+        base.record(f)
+    assert save_manifest(base)
+    return load_manifest(), load_manifest()
+
+
+def _names():
+    return sorted(load_manifest().entries)
+
+
+def test_records_of_both_writers_are_kept(bucket):
+    a, b = _writers(_file("01"))
+    a.record(_file("02"))
+    b.record(_file("03"))
+    assert save_manifest(a) and save_manifest(b)
+    assert _names() == ["prod_01012025.xlsx", "prod_02012025.xlsx", "prod_03012025.xlsx"]
+
+
+@pytest.mark.parametrize("first", ["remover", "recorder"])
+def test_removal_survives_a_concurrent_record(bucket, first):
+    remover, recorder = _writers(_file("01"), _file("02"))
+    remover.sync([_file("02")])                 # 01 is gone from the bucket
+    recorder.record(_file("03"))                # still lists 01 in its copy
+    order = [remover, recorder] if first == "remover" else [recorder, remover]
+    for m in order:
+        assert save_manifest(m)
+    assert _names() == ["prod_02012025.xlsx", "prod_03012025.xlsx"]
+
+
+def test_clear_drops_what_was_saved_before_it(bucket):
+    clearer, recorder = _writers(_file("01"))
+    recorder.record(_file("02"))
+    assert save_manifest(recorder)
+    clearer.clear()
+    assert save_manifest(clearer)
+    assert _names() == []
+
+
+def test_records_after_a_clear_are_kept(bucket):
+    clearer, recorder = _writers(_file("01"))
+    clearer.clear()
+    assert save_manifest(clearer)
+    recorder.record(_file("02"))
+    assert save_manifest(recorder)
+    # the recorder adds its own change, not the entries it loaded
+    assert _names() == ["prod_02012025.xlsx"]
+
+
+@pytest.mark.parametrize("first", ["older", "newer"])
+def test_the_later_updated_at_wins(bucket, first):
+    name = "prod_01012025.xlsx"
+    older, newer = _writers(_file("01"))
+    t = older.get(name)["updated_at"]
+    older.record(_file("01", etag="old"))
+    newer.record(_file("01", etag="new"))
+    older.entries[name]["updated_at"] = t + 1
+    newer.entries[name]["updated_at"] = t + 2
+    order = [older, newer] if first == "older" else [newer, older]
+    for m in order:
+        assert save_manifest(m)
+    entry = load_manifest().get(name)
+    assert (entry["etag"], entry["updated_at"]) == ("new", t + 2)
+
+
+def test_a_saved_copy_adopts_the_merged_entries(bucket):
+    a, b = _writers(_file("01"))
+    b.record(_file("02"))
+    assert save_manifest(b)
+    a.record(_file("03"))
+    assert save_manifest(a)
+    assert sorted(a.entries) == _names()
+    assert len(a.between(*a.bounds())) == 3
+
+
+def test_records_during_saves_are_not_lost(bucket):
+    # one Manifest shared by the sessions of an app process
+    shared = Manifest()
+    days = [f"{d:02d}" for d in range(1, 29)]
+
+    def record(part):
+        for day in part:
+            shared.record(_file(day))
+            time.sleep(0.01)        # spread the records over several saves
+
+    threads = [threading.Thread(target=record, args=(days[i::4],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        save_manifest(shared)
+    for t in threads:
+        t.join()
+    assert save_manifest(shared)
+    assert _names() == sorted(_file(day)["name"] for day in days)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from downtime_codes import get_reasons
+from layouts import get_layouts
+from machines import get_registry
+from metrics import count
+
+# -------------------------------------------------------
+#          PARSED WORKBOOK CACHE (PARQUET ON DISK)
+# -------------------------------------------------------
+# One directory per source file holding the normalized production and
+# error frames.  The entry is valid only while the stored key matches the
+# current (size, eTag) of the object, so a re-upload invalidates it.
+#
+# Ingest writes each parse here and to the fact store.  The fact store
+# only answers "is this name stored at this key"; this cache is what lets
+# a re-ingest that the store cannot skip (ingest.py --force after a store
+# format change, a reset or new DM_FACTSTORE_DIR, an object reverted to an
+# earlier version) reuse recent parses instead of downloading and parsing
+# again.  It is bounded by DM_CACHE_MAX_BYTES, least recently used first;
+# the size is tracked as entries are written and the directory is only
+# scanned when it is over quota, then trimmed to 90% so the next scans are
+# some writes away.
+
+CACHE_DIR = os.environ.get(
+    "DM_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "workbooks")
+)
+CACHE_MAX_BYTES = int(os.environ.get("DM_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Bump when the parsing rules change so stale frames are not reused.
+# The machine registry, sheet template and downtime alias fingerprints
+# are part of the key for the same reason.
+PARSER_VERSION = "4"
+
+
+def make_cache_key(filename, size=None, etag=None, content=None):
+    version = (f"{PARSER_VERSION}|{get_registry().fingerprint}|{get_layouts().fingerprint}"
+               f"|{get_reasons().fingerprint}")
+    if etag or size:
+        raw = f"{version}|{filename}|{size}|{etag}"
+    elif content is not None:
+        raw = f"{version}|{filename}|{hashlib.sha256(content).hexdigest()}"
+    else:
+        return None
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class WorkbookCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None      # running total, counted on first write
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_dir(self, filename):
+        return os.path.join(self.root, hashlib.sha1(filename.encode()).hexdigest())
+
+    def get(self, filename, key):
+        found = self._load(filename, key)
+        count("workbook_cache_hits" if found is not None else "workbook_cache_misses")
+        return found
+
+    def _load(self, filename, key):
+        if key is None:
+            return None
+        d = self._entry_dir(filename)
+        try:
+            with open(os.path.join(d, "meta.json")) as fh:
+                meta = json.load(fh)
+            if meta.get("key") != key:
+                return None
+            prod = _read_frame(os.path.join(d, "prod.parquet"))
+            err = _read_frame(os.path.join(d, "err.parquet"))
+        except (OSError, ValueError):
+            return None
+
+        # LRU bookkeeping: the meta file's mtime is the last access time
+        try:
+            os.utime(os.path.join(d, "meta.json"))
+        except OSError:
+            pass
+        return prod, err
+
+    def put(self, filename, key, prod_df, err_df):
+        if key is None:
+            return
+        d = self._entry_dir(filename)
+        tmp = f"{d}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            _write_frame(prod_df, os.path.join(tmp, "prod.parquet"))
+            _write_frame(err_df, os.path.join(tmp, "err.parquet"))
+            with open(os.path.join(tmp, "meta.json"), "w") as fh:
+                json.dump({"key": key, "name": filename, "stored_at": time.time()}, fh)
+            with self._lock:
+                if self._bytes is None:
+                    self._bytes = self._scan()[0]
+                self._bytes += _dir_size(tmp) - _dir_size(d)
+                shutil.rmtree(d, ignore_errors=True)
+                os.replace(tmp, d)
+                over = self._bytes > self.max_bytes
+        except Exception:
+            # a failed cache write must never break the dashboard
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        if over:
+            self._evict()
+
+    def invalidate(self, filename):
+        with self._lock:
+            d = self._entry_dir(filename)
+            if self._bytes is not None:
+                self._bytes -= _dir_size(d)
+            shutil.rmtree(d, ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+            self._bytes = 0
+
+    def _scan(self):
+        # -> (total bytes, [(last access, bytes, dir)]); also corrects the
+        # running total for entries written by other processes
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            d = os.path.join(self.root, name)
+            meta = os.path.join(d, "meta.json")
+            try:
+                atime = os.path.getmtime(meta)
+            except OSError:
+                continue
+            size = _dir_size(d)
+            entries.append((atime, size, d))
+            total += size
+        return total, entries
+
+    def _evict(self):
+        with self._lock:
+            total, entries = self._scan()
+            # oldest access first, down to 90% of the quota
+            for _, size, d in sorted(entries):
+                if total <= self.max_bytes * 0.9:
+                    break
+                shutil.rmtree(d, ignore_errors=True)
+                total -= size
+                count("workbook_cache_evictions")
+            self._bytes = total
+
+
+def _dir_size(d):
+    try:
+        return sum(e.stat().st_size for e in os.scandir(d) if e.is_file())
+    except OSError:
+        return 0
+
+
+def _write_frame(df, path):
+    if df is None or df.empty:
+        # marker for "sheet produced nothing" so empty results are cached too
+        open(path, "wb").close()
+        return
+    df.to_parquet(path, index=False)
+
+
+def _read_frame(path):
+    if os.path.getsize(path) == 0:
+        return pd.DataFrame()
+    return pd.read_parquet(path)